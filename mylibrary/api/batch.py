@@ -0,0 +1,160 @@
+import contextvars
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import QueryDict
+from django.urls import Resolver404, resolve
+from django.utils.datastructures import MultiValueDict
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.throttling import get_scope_action
+from api.tracing import TracedPermissionsMixin
+from core import tracing
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий пул потоков для параллельных пакетов.
+
+    Потоки живут вместе с процессом, поэтому их соединения с БД, как и
+    соединения потоков gunicorn, переиспользуются до CONN_MAX_AGE. Новое
+    соединение сбрасывает кеши справочников (library.cache.listen), и
+    открывать его на каждый пакет было бы дорого.
+    """
+    global executor
+
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_MAX_WORKERS,
+                thread_name_prefix='batch')
+
+        return executor
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET'], default='GET')
+    path = serializers.CharField(max_length=2000)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(child=BatchItemSerializer(),
+                                     allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise ValidationError(
+                f'Не больше {settings.BATCH_MAX_REQUESTS} запросов')
+
+        return value
+
+
+class BatchView(TracedPermissionsMixin, APIView):
+    """Несколько GET-запросов к API за один запрос.
+
+    Вложенные запросы выполняются теми же вьюсетами в этом процессе, без
+    middleware и повторной проверки токена: пользователь передается им
+    уже аутентифицированным. Кеши процесса (языки, авторы) общие для всех
+    вложенных запросов. Стоимость запроса берется из scope_costs по
+    действию (поиск дороже списка), сумма ограничена BATCH_MAX_COST.
+    С parallel=true запросы выполняются в общем пуле процесса из
+    BATCH_MAX_WORKERS потоков, каждый со своим соединением с БД.
+    """
+    scope_costs = {'search': 5}
+    default_cost = 1
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+
+        calls = [self.get_call(request, item['path']) for item in items]
+        cost = sum(call[2] for call in calls)
+        if cost > settings.BATCH_MAX_COST:
+            raise ValidationError({'requests': (
+                f'Стоимость запросов {cost} больше '
+                f'{settings.BATCH_MAX_COST}')})
+
+        if serializer.validated_data['parallel'] and len(calls) > 1:
+            # Спаны потоков попадают в трассировку пакета
+            futures = [get_executor().submit(
+                contextvars.copy_context().run, self.call_in_thread,
+                *call[:2]) for call in calls]
+            responses = [future.result() for future in futures]
+        else:
+            responses = [self.call(*call[:2]) for call in calls]
+
+        return Response({'responses': responses})
+
+    def get_call(self, request, path):
+        url = urlsplit(path)
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            raise ValidationError({'requests': f'Путь {url.path} не найден'})
+
+        view_class = getattr(match.func, 'cls', None)
+        actions = getattr(match.func, 'actions', None) or {}
+        if (view_class is None or not issubclass(view_class, APIView)
+                or issubclass(view_class, BatchView)):
+            raise ValidationError(
+                {'requests': f'Путь {url.path} нельзя вызвать в пакете'})
+
+        query_params = QueryDict(url.query)
+        scope = get_scope_action(actions.get('get'), query_params)
+        cost = self.scope_costs.get(scope, self.default_cost)
+
+        return match, self.build_request(request, url), cost
+
+    @staticmethod
+    def build_request(request, url):
+        sub_request = copy.copy(request._request)
+        sub_request.method = 'GET'
+        sub_request.path = sub_request.path_info = url.path
+        sub_request.META = dict(
+            request.META, REQUEST_METHOD='GET', PATH_INFO=url.path,
+            QUERY_STRING=url.query, CONTENT_LENGTH='0')
+        sub_request.META.pop('CONTENT_TYPE', None)
+        sub_request.GET = QueryDict(url.query)
+        sub_request._post = QueryDict()
+        sub_request._files = MultiValueDict()
+        # DRF пропускает аутентификацию, если пользователь задан заранее
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+
+        return sub_request
+
+    @staticmethod
+    def call(match, sub_request):
+        sub_request.resolver_match = match
+
+        with tracing.span('batch.request', **{
+                'http.target': sub_request.get_full_path()}):
+            response = match.func(sub_request, *match.args, **match.kwargs)
+
+        if not isinstance(response, Response):
+            return {'status': response.status_code, 'headers': {},
+                    'data': None}
+
+        return {'status': response.status_code,
+                'headers': dict(response.items()),
+                'data': response.data}
+
+    def call_in_thread(self, match, sub_request):
+        # Как до и после обычного запроса: закрываются только сломанные
+        # соединения и соединения старше CONN_MAX_AGE
+        close_old_connections()
+        try:
+            return self.call(match, sub_request)
+        finally:
+            close_old_connections()
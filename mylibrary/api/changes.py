@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from api.serializers import (AuthorSerializer, BookSerializer,
+                             LanguageSerializer)
+from library.models import Author, Book, Change, Language
+
+CHANGE_MODELS = {
+    'language': (Language, LanguageSerializer),
+    'author': (Author, AuthorSerializer),
+    'book': (Book, BookSerializer),
+}
+
+
+def get_visible_queryset(model_name, year, is_staff=False):
+    """Объекты, которые видит пользователь: без скрытых авторов и их книг,
+    книги из будущего - только сотрудникам."""
+    model, serializer_class = CHANGE_MODELS[model_name]
+    queryset = model.objects.all()
+
+    if model is Book:
+        queryset = queryset.exclude_hidden_authors()
+        if not is_staff:
+            queryset = queryset.filter(publication_year__lte=year)
+
+    return queryset
+
+
+def get_latest_changes(changes):
+    """Последние записи журнала по каждому объекту в порядке журнала.
+
+    Данные берутся на момент запроса, поэтому от нескольких записей об
+    одном объекте достаточно последней.
+    """
+    latest = {}
+    for change in changes:
+        latest.pop((change.model, change.object_id), None)
+        latest[(change.model, change.object_id)] = change
+
+    return list(latest.values())
+
+
+def get_change_results(changes, year, is_staff=False):
+    """Записи журнала вместе с текущими данными объектов.
+
+    Удаленные и невидимые пользователю объекты приходят как delete.
+    """
+    changes = get_latest_changes(changes)
+
+    ids = defaultdict(set)
+    for change in changes:
+        ids[change.model].add(change.object_id)
+
+    objects = {}
+    for model_name, model_ids in ids.items():
+        serializer_class = CHANGE_MODELS[model_name][1]
+        queryset = get_visible_queryset(model_name, year, is_staff).filter(
+            pk__in=model_ids)
+        objects[model_name] = {
+            item['id']: item
+            for item in serializer_class(queryset, many=True).data}
+
+    results = []
+    for change in changes:
+        data = objects[change.model].get(change.object_id)
+        results.append({
+            'model': change.model,
+            'action': change.action if data is not None else Change.DELETE,
+            'id': change.object_id,
+            'data': data,
+        })
+
+    return results
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from rest_framework import status, views
+from rest_framework.exceptions import APIException
+
+from api.timeouts import is_query_canceled
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Курсор устарел, нужна полная синхронизация'
+    default_code = 'resync_required'
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой файл'
+    default_code = 'payload_too_large'
+
+
+class StatementTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Запрос выполнялся слишком долго, повторите позже'
+    default_code = 'statement_timeout'
+
+    def __init__(self, wait=None):
+        super().__init__()
+        # DRF передает wait в заголовке Retry-After
+        self.wait = wait
+
+
+def exception_handler(exc, context):
+    if is_query_canceled(exc):
+        # Прерванная транзакция не может продолжаться
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            transaction.set_rollback(True)
+
+        handle_query_canceled = getattr(
+            context.get('view'), 'handle_query_canceled', None)
+        if handle_query_canceled is not None:
+            handle_query_canceled()
+
+        exc = StatementTimeout(settings.STATEMENT_TIMEOUT_RETRY_AFTER)
+
+    return views.exception_handler(exc, context)
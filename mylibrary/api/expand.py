@@ -0,0 +1,54 @@
+from rest_framework.exceptions import ValidationError
+
+
+class ExpandMixin:
+    """Подставляет вместо id связанных объектов их данные по ?expand=.
+
+    expand_fields задает для поля кеш, из которого берутся объекты, и
+    сериализатор. Объекты читаются из кеша процесса, а не соединением в
+    основном запросе, и каждый сериализуется один раз на ответ.
+    """
+    expand_param = 'expand'
+    expand_fields = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        value = request.query_params.get(self.expand_param, '')
+        self.expand = [name for name in value.split(',') if name]
+
+        unknown = set(self.expand) - self.expand_fields.keys()
+        if unknown:
+            raise ValidationError({self.expand_param: (
+                f'Нельзя раскрыть поля: {", ".join(sorted(unknown))}. '
+                f'Доступны: {", ".join(self.expand_fields)}')})
+
+    def get_expand_items(self, data):
+        if isinstance(data, list):
+            return data
+        if 'results' in data:
+            return data['results']
+
+        return [data]
+
+    def expand_items(self, items):
+        for name in self.expand:
+            cache, serializer_class = self.expand_fields[name]
+
+            ids = {item[name] for item in items if item[name] is not None}
+            objects = cache.get_many(ids)
+            expanded = {
+                pk: serializer_class(
+                    instance, context=self.get_serializer_context()).data
+                for pk, instance in objects.items()}
+
+            for item in items:
+                if item[name] is not None:
+                    item[name] = expanded.get(item[name])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (getattr(self, 'expand', None) and response.status_code == 200
+                and self.action in ('list', 'retrieve')):
+            self.expand_items(self.get_expand_items(response.data))
+
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,40 @@
+from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
+
+from library.models import Book
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class BookFilter(filters.FilterSet):
+    author__in = NumberInFilter(field_name='author', lookup_expr='in')
+    language__in = NumberInFilter(field_name='language', lookup_expr='in')
+
+    class Meta:
+        model = Book
+        fields = {
+            'language': ['exact'],
+            'author': ['exact'],
+            'publication_year': ['exact', 'gte', 'lte'],
+            'created': ['gte', 'lte'],
+        }
+
+
+class StableOrderingFilter(OrderingFilter):
+    """Сортировка с добором по id в том же направлении.
+
+    Так порядок однозначен при равных значениях, а запрос с лимитом читает
+    индекс (..., поле, id) без отдельной сортировки.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+
+        if not ordering:
+            return ordering
+
+        tiebreaker = '-id' if ordering[-1].startswith('-') else 'id'
+
+        return [*ordering, tiebreaker]
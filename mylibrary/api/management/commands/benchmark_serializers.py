@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.serializers import (AuthorSerializer, BookSerializer,
+                             LanguageSerializer)
+from api.values import ValuesSerializer
+from library.models import Author, Book, Language
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время сериализации списка через ModelSerializer и '
+            'через ValuesSerializer на временных данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help='Число книг и авторов')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Число повторов, берется лучшее время')
+
+    def create_rows(self, rows):
+        languages = Language.objects.bulk_create(
+            Language(name=f'Язык {number}') for number in range(rows))
+        authors = Author.objects.bulk_create(
+            Author(first_name='Имя', last_name=f'Фамилия {number}')
+            for number in range(rows))
+        Book.objects.bulk_create(
+            Book(name=f'Книга {number}', publication_year=1900 + number % 100,
+                 language=languages[number], author=authors[number],
+                 cover=f'covers/{number}.jpg' if number % 2 else '')
+            for number in range(rows))
+
+    def benchmark(self, name, queryset, serializer_class, repeat):
+        def serialize_models():
+            return serializer_class(list(queryset), many=True).data
+
+        def serialize_values():
+            serializer = ValuesSerializer(serializer_class())
+            return serializer.to_representation(
+                list(serializer.get_queryset(queryset)))
+
+        rows = queryset.count()
+        models_time = measure(serialize_models, repeat)
+        values_time = measure(serialize_values, repeat)
+
+        self.stdout.write(
+            f'{name}: ModelSerializer {models_time / rows * 1e6:.1f} мкс, '
+            f'ValuesSerializer {values_time / rows * 1e6:.1f} мкс на строку, '
+            f'быстрее в {models_time / values_time:.1f} раза')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_rows(options['rows'])
+            for name, queryset, serializer_class in (
+                    ('book', Book.objects.all(), BookSerializer),
+                    ('author', Author.objects.all(), AuthorSerializer),
+                    ('language', Language.objects.all(),
+                     LanguageSerializer)):
+                self.benchmark(name, queryset, serializer_class,
+                               options['repeat'])
+
+            # Временные данные не сохраняются
+            transaction.set_rollback(True)
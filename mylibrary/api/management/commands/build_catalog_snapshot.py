@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.snapshots import build_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Обновляет снимок каталога для новых установок по журналу '
+            'изменений')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Построить снимок заново из таблиц')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, обновляя снимок')
+        parser.add_argument(
+            '--interval', type=float, default=300,
+            help='Пауза между обновлениями, с')
+
+    def handle(self, *args, **options):
+        full = options['full']
+
+        while True:
+            manifest = build_snapshot(full=full)
+            full = False
+
+            if manifest is not None:
+                snapshot = manifest['snapshot']
+                self.stdout.write(
+                    f'Снимок {snapshot["file"]}: строк {snapshot["rows"]}, '
+                    f'{snapshot["size"]} байт, дельт '
+                    f'{len(manifest["deltas"])}')
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.paginator import EstimatedCountPaginator
+
+
+class EstimatedLimitOffsetPagination(LimitOffsetPagination):
+    """Пагинация по ?limit=&offset=, включается только при наличии limit.
+
+    Для больших выборок count берется из оценки планировщика. Выборка без
+    сортировки (нет ?ordering=) листается по id, иначе страницы могут
+    пересекаться и пропускать строки.
+    """
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        return EstimatedCountPaginator(queryset, self.limit).count
+
+
+class CreatedKeysetPagination(BasePagination):
+    """Пагинация от новых записей к старым по курсору (created, id).
+
+    Включается параметром ?limit=. Следующая страница читается с места
+    предыдущей по индексу (..., created, id) без OFFSET и COUNT, поэтому
+    стоимость страницы не зависит от ее номера. Курсор приходит в поле next.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    max_limit = 1000
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return None
+
+        return min(limit, self.max_limit) if limit > 0 else None
+
+    def encode_cursor(self, item):
+        value = f'{item.created.isoformat()}|{item.pk}'
+
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            created, pk = base64.urlsafe_b64decode(
+                cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(created), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.request = request
+        queryset = queryset.order_by('-created', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(created__lte=created).exclude(
+                created=created, id__gte=pk)
+
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = self.encode_cursor(page[-1])
+
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -1,36 +1,116 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.reverse import reverse
 
+from api.tracing import TracedListSerializer, TracedSerializerMixin
+from library.cache import get_reference_cache
 from library.models import Author, Book, Follow, Language
 
 User = get_user_model()
 
+FOLLOW_BULK_MAX_AUTHORS = 1000
+STATS_MAX_AUTHORS = 1000
+CHANGES_MAX_LIMIT = 1000
+COVER_URL_PK = '__pk__'
 
-class AuthorSerializer(serializers.ModelSerializer):
+
+class CachedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """Ищет языки и авторов в кеше процесса, а не запросом к БД."""
+
+    def to_internal_value(self, data):
+        queryset = self.get_queryset()
+        cache = get_reference_cache(queryset.model)
+        # Кеш хранит строки менеджера по умолчанию (для авторов - без
+        # скрытых), для queryset с другими условиями он не подходит
+        if (cache is None or queryset.query.where
+                != cache.get_queryset().query.where):
+            return super().to_internal_value(data)
+
+        try:
+            pk = cache.model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        instance = cache.get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+
+        return instance
+
+
+class AuthorSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     class Meta:
-        exclude = ['created']
+        exclude = ['created', 'is_hidden']
+        list_serializer_class = TracedListSerializer
         model = Author
 
 
-class LanguageSerializer(serializers.ModelSerializer):
+class LanguageSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         exclude = ['created']
+        list_serializer_class = TracedListSerializer
         model = Language
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TracedSerializerMixin, serializers.ModelSerializer):
+    cover = serializers.SerializerMethodField()
+    cover_thumbnail = serializers.SerializerMethodField()
+
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
     class Meta:
         exclude = ['created']
+        list_serializer_class = TracedListSerializer
         model = Book
 
+    def get_cover_url(self, book, image, size=None):
+        if not image:
+            return None
+
+        url = reverse('api:books-cover', args=[book.pk],
+                      request=self.context.get('request'))
+        if size is not None:
+            url = f'{url}?size={size}'
+
+        return url
+
+    def get_cover(self, book):
+        return self.get_cover_url(book, book.cover)
+
+    def get_cover_thumbnail(self, book):
+        return self.get_cover_url(book, book.cover_thumbnail, 'thumbnail')
+
+    def get_values_mappers(self):
+        # Адрес строится один раз на список, а не reverse на каждую книгу
+        url = reverse('api:books-cover', args=[COVER_URL_PK],
+                      request=self.context.get('request'))
+        prefix, _, suffix = url.rpartition(COVER_URL_PK)
+
+        def get_cover(pk, name):
+            return f'{prefix}{pk}{suffix}' if name else None
+
+        def get_cover_thumbnail(pk, name):
+            return f'{prefix}{pk}{suffix}?size=thumbnail' if name else None
+
+        return {
+            'cover': (('id', 'cover'), get_cover),
+            'cover_thumbnail': (('id', 'cover_thumbnail'),
+                                get_cover_thumbnail),
+        }
+
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     user = PrimaryKeyRelatedField(
         read_only=True, default=serializers.CurrentUserDefault())
+    author_data = AuthorSerializer(source='author', read_only=True)
+
+    serializer_related_field = CachedPrimaryKeyRelatedField
 
     class Meta:
         exclude = ['created']
+        list_serializer_class = TracedListSerializer
         model = Follow
 
         validators = [
@@ -39,3 +119,58 @@ class FollowSerializer(serializers.ModelSerializer):
                 fields=['user', 'author']
             )
         ]
+
+
+class FollowBulkSerializer(serializers.Serializer):
+    follow = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list,
+        max_length=FOLLOW_BULK_MAX_AUTHORS)
+    unfollow = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list,
+        max_length=FOLLOW_BULK_MAX_AUTHORS)
+
+    def validate(self, data):
+        if set(data['follow']) & set(data['unfollow']):
+            raise serializers.ValidationError(
+                'Нельзя одновременно подписаться и отписаться от автора')
+
+        return data
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    bucket = serializers.IntegerField(min_value=1, max_value=1000, default=1)
+    language = serializers.IntegerField(min_value=1, required=False)
+
+
+class AuthorStatsQuerySerializer(serializers.Serializer):
+    author = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        max_length=STATS_MAX_AUTHORS)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=STATS_MAX_AUTHORS, default=100)
+
+
+class RecommendationQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class ChangeCursorField(serializers.CharField):
+    """Курсор ленты изменений: год выдачи, txid и id последней записи."""
+    default_error_messages = {'invalid': 'Некорректный курсор'}
+
+    def to_internal_value(self, data):
+        try:
+            year, txid, change_id = map(int, data.split(':'))
+        except (AttributeError, ValueError):
+            self.fail('invalid')
+
+        return year, txid, change_id
+
+    def to_representation(self, value):
+        return ':'.join(map(str, value))
+
+
+class ChangeQuerySerializer(serializers.Serializer):
+    since = ChangeCursorField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=CHANGES_MAX_LIMIT, default=500)
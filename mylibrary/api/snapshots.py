@@ -0,0 +1,315 @@
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.changes import (CHANGE_MODELS, get_change_results,
+                         get_latest_changes, get_visible_queryset)
+from api.serializers import ChangeCursorField
+from api.values import ValuesSerializer
+from library.models import Change
+
+MANIFEST_NAME = 'manifest.json'
+SNAPSHOT_FORMAT = 1
+# Порядок записей в снимке и дельте: модель, затем id
+MODEL_ORDER = {model_name: position
+               for position, model_name in enumerate(CHANGE_MODELS)}
+DUMP_CHUNK_SIZE = 2000
+# Первый ключ pg_advisory_lock(int, int), см. FANOUT_LOCK_NAMESPACE
+SNAPSHOT_LOCK_NAMESPACE = 38
+
+
+def get_snapshot_path(name):
+    return os.path.join(settings.SNAPSHOT_ROOT, name)
+
+
+def get_cursor(year, txid, change_id):
+    return ChangeCursorField().to_representation((year, txid, change_id))
+
+
+def get_file_name(prefix, year, txid, change_id):
+    return f'{prefix}-{year}-{txid}-{change_id}.jsonl.gz'
+
+
+def dump_record(record):
+    return json.dumps(record, cls=JSONEncoder, ensure_ascii=False,
+                      separators=(',', ':')).encode() + b'\n'
+
+
+def get_record_key(record):
+    return MODEL_ORDER[record['model']], record['id']
+
+
+def read_manifest():
+    try:
+        with open(get_snapshot_path(MANIFEST_NAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(manifest):
+    path = get_snapshot_path(MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(manifest, file, ensure_ascii=False)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_records(name):
+    with gzip.open(get_snapshot_path(name), 'rb') as file:
+        for line in file:
+            yield json.loads(line)
+
+
+def write_lines(name, lines):
+    """Пишет строки JSONL в name через временный файл.
+
+    Файл появляется под своим именем только целиком, поэтому nginx не
+    отдаст недописанный снимок. Возвращает описание файла для манифеста.
+    """
+    path = get_snapshot_path(name)
+    count = 0
+    with gzip.open(f'{path}.tmp', 'wb', compresslevel=6) as file:
+        for line in lines:
+            file.write(line)
+            count += 1
+    os.replace(f'{path}.tmp', path)
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(block)
+
+    return {'file': name, 'size': os.path.getsize(path),
+            'sha256': sha256.hexdigest(), 'rows': count}
+
+
+def get_last_change():
+    last = Change.objects.committed().order_by('-txid', '-id').values_list(
+        'txid', 'id').first()
+
+    return last or (0, 0)
+
+
+def dump_catalog(year):
+    """Все видимые обычному пользователю объекты, по модели и id."""
+    for model_name, (_, serializer_class) in CHANGE_MODELS.items():
+        serializer = ValuesSerializer(serializer_class())
+        rows = serializer.get_queryset(
+            get_visible_queryset(model_name, year).order_by('id'))
+
+        chunk = []
+        for row in rows.iterator(chunk_size=DUMP_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == DUMP_CHUNK_SIZE:
+                yield from dump_items(model_name, serializer, chunk)
+                chunk = []
+        yield from dump_items(model_name, serializer, chunk)
+
+
+def dump_items(model_name, serializer, rows):
+    for data in serializer.to_representation(rows):
+        yield dump_record({'model': model_name, 'id': data['id'],
+                           'data': data})
+
+
+def merge_changes(snapshot_name, changes):
+    """Накладывает изменения на предыдущий снимок за один проход.
+
+    Снимок и изменения отсортированы по (модель, id), поэтому новый снимок
+    получается слиянием без загрузки старого в память. Неизмененные строки
+    копируются как есть.
+    """
+    changes = iter(changes)
+    change = next(changes, None)
+
+    with gzip.open(get_snapshot_path(snapshot_name), 'rb') as file:
+        for line in file:
+            key = get_record_key(json.loads(line))
+
+            while change is not None and get_record_key(change) < key:
+                if change['data'] is not None:
+                    yield dump_record(get_snapshot_record(change))
+                change = next(changes, None)
+
+            if change is not None and get_record_key(change) == key:
+                if change['data'] is not None:
+                    yield dump_record(get_snapshot_record(change))
+                change = next(changes, None)
+            else:
+                yield line
+
+    while change is not None:
+        if change['data'] is not None:
+            yield dump_record(get_snapshot_record(change))
+        change = next(changes, None)
+
+
+def read_keyed_changes(name, position):
+    for change in read_records(name):
+        yield get_record_key(change), position, change
+
+
+def merge_deltas(names):
+    """Объединяет дельты, отсортированные по (модель, id), в одну.
+
+    Для объекта, измененного в нескольких дельтах, остается запись из
+    последней. Дельты читаются с диска потоком.
+    """
+    previous = None
+    for key, _, change in heapq.merge(*(
+            read_keyed_changes(name, position)
+            for position, name in enumerate(names))):
+        if previous is not None and get_record_key(previous) != key:
+            yield previous
+        previous = change
+
+    if previous is not None:
+        yield previous
+
+
+def get_snapshot_record(change):
+    return {'model': change['model'], 'id': change['id'],
+            'data': change['data']}
+
+
+def get_delta(year, txid, change_id):
+    """Не больше SNAPSHOT_MAX_DELTA_CHANGES записей журнала после курсора."""
+    rows = list(Change.objects.committed().after(txid, change_id).order_by(
+        'txid', 'id')[:settings.SNAPSHOT_MAX_DELTA_CHANGES])
+    if not rows:
+        return None, []
+
+    last = rows[-1].txid, rows[-1].id
+    changes = get_latest_changes(rows)
+    results = []
+    for start in range(0, len(changes), DUMP_CHUNK_SIZE):
+        results.extend(get_change_results(
+            changes[start:start + DUMP_CHUNK_SIZE], year))
+
+    return last, sorted(results, key=get_record_key)
+
+
+def is_stale_cursor(cursor, year):
+    cursor_year, txid, change_id = ChangeCursorField().to_internal_value(
+        cursor)
+
+    return (cursor_year != year
+            or Change.objects.is_pruned(txid, change_id))
+
+
+def build_full(year):
+    txid, change_id = get_last_change()
+    snapshot = write_lines(
+        get_file_name('catalog', year, txid, change_id), dump_catalog(year))
+    snapshot['cursor'] = get_cursor(year, txid, change_id)
+
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'cursor': snapshot['cursor'],
+        'created': datetime.now().isoformat(),
+        'snapshot': snapshot,
+        'deltas': [],
+    }
+
+
+def build_delta(cursor, year):
+    _, txid, change_id = ChangeCursorField().to_internal_value(cursor)
+    last, changes = get_delta(year, txid, change_id)
+    if last is None:
+        return None
+
+    delta = write_lines(get_file_name('delta', year, *last),
+                        map(dump_record, changes))
+    delta['from'] = cursor
+    delta['to'] = get_cursor(year, *last)
+
+    return delta
+
+
+def build_incremental(manifest, year):
+    # Журнал читается шагами по дельте, а снимок собирается один раз
+    deltas = []
+    cursor = manifest['cursor']
+    while True:
+        delta = build_delta(cursor, year)
+        if delta is None:
+            break
+        deltas.append(delta)
+        cursor = delta['to']
+
+    if not deltas:
+        return None
+
+    _, txid, change_id = ChangeCursorField().to_internal_value(cursor)
+    snapshot = write_lines(
+        get_file_name('catalog', year, txid, change_id),
+        merge_changes(manifest['snapshot']['file'],
+                      merge_deltas(delta['file'] for delta in deltas)))
+    snapshot['cursor'] = cursor
+
+    deltas = manifest['deltas'] + deltas
+
+    return dict(manifest, cursor=cursor,
+                created=datetime.now().isoformat(), snapshot=snapshot,
+                deltas=deltas[-settings.SNAPSHOT_MAX_DELTAS:])
+
+
+def delete_stale_files(manifest):
+    # Файл, на который манифест больше не ссылается, могут еще скачивать
+    referenced = {manifest['snapshot']['file'], MANIFEST_NAME}
+    referenced.update(delta['file'] for delta in manifest['deltas'])
+    stale_before = time.time() - settings.SNAPSHOT_FILE_TTL
+
+    for name in os.listdir(settings.SNAPSHOT_ROOT):
+        path = get_snapshot_path(name)
+        if name not in referenced and os.path.getmtime(path) < stale_before:
+            os.remove(path)
+
+
+def build_snapshot(full=False):
+    """Обновляет снимок каталога и манифест.
+
+    Первый снимок года строится из таблиц. Дальше новый снимок получается
+    из предыдущего и изменений из журнала после его курсора, а изменения
+    сохраняются отдельной дельтой, чтобы клиент со старым снимком скачал
+    только их. Большой хвост журнала разбивается на несколько дельт по
+    SNAPSHOT_MAX_DELTA_CHANGES записей. В новом году снимок строится
+    заново: открываются книги, о которых журнал не сообщал. Так же и после
+    очистки журнала дальше курсора снимка. Одновременный запуск ждет
+    окончания текущего. Возвращает манифест или None, если изменений не
+    было.
+    """
+    os.makedirs(settings.SNAPSHOT_ROOT, exist_ok=True)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s, 0)',
+                       [SNAPSHOT_LOCK_NAMESPACE])
+    try:
+        year = datetime.now().year
+        manifest = read_manifest()
+
+        if (full or manifest is None
+                or manifest['format'] != SNAPSHOT_FORMAT
+                or is_stale_cursor(manifest['cursor'], year)):
+            manifest = build_full(year)
+        else:
+            manifest = build_incremental(manifest, year)
+            if manifest is None:
+                return None
+
+        write_manifest(manifest)
+        delete_stale_files(manifest)
+
+        return manifest
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, 0)',
+                           [SNAPSHOT_LOCK_NAMESPACE])
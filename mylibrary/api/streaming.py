@@ -0,0 +1,305 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+
+from library.cache import author_cache
+from library.models import Book, Follow
+
+logger = logging.getLogger(__name__)
+
+BOOK_CREATED_CHANNEL = 'library_book_created'
+BOOK_STREAM_PATH = '/api/v1/books/stream/'
+HEARTBEAT_INTERVAL = 15
+FOLLOWS_REFRESH_INTERVAL = 60
+QUEUE_SIZE = 100
+REPLAY_LIMIT = 100
+# Поля уведомления триггера library_book_notify, в том же виде отдаются
+# и пропущенные книги
+EVENT_FIELDS = ('id', 'name', 'author', 'language', 'publication_year')
+
+
+class Subscription:
+    def __init__(self):
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.authors = frozenset()
+        self.closed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: закрываем поток, после
+            # переподключения он дочитает пропущенное по Last-Event-ID
+            self.closed = True
+
+
+class BookListener:
+    """Одно LISTEN-соединение на процесс для всех открытых потоков.
+
+    Уведомления читаются в цикле событий через add_reader и раздаются
+    подпискам по индексу автор -> подписки. Соединение открывается с первой
+    подпиской и закрывается с последней. При обрыве все потоки закрываются,
+    чтобы клиенты переподключились и дочитали пропущенное.
+    """
+
+    def __init__(self, channel=BOOK_CREATED_CHANNEL, using='default'):
+        self.channel = channel
+        self.using = using
+        self.connection = None
+        self.subscriptions = set()
+        self.subscriptions_by_author = defaultdict(set)
+
+    def subscribe(self):
+        self.start()
+        subscription = Subscription()
+        self.subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.follow(subscription, frozenset())
+        self.subscriptions.discard(subscription)
+
+        if not self.subscriptions:
+            self.stop()
+
+    def follow(self, subscription, authors):
+        for author in subscription.authors - authors:
+            subscriptions = self.subscriptions_by_author[author]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions_by_author[author]
+
+        for author in authors - subscription.authors:
+            self.subscriptions_by_author[author].add(subscription)
+
+        subscription.authors = authors
+
+    def start(self):
+        if self.connection is not None:
+            return
+
+        params = connections[self.using].get_connection_params()
+        self.connection = psycopg2.connect(**params)
+        self.connection.set_session(autocommit=True)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+
+        asyncio.get_event_loop().add_reader(
+            self.connection.fileno(), self.read_notifies)
+
+    def stop(self):
+        if self.connection is None:
+            return
+
+        asyncio.get_event_loop().remove_reader(self.connection.fileno())
+        self.connection.close()
+        self.connection = None
+
+    def read_notifies(self):
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            logger.exception('Потеряно соединение LISTEN %s', self.channel)
+            self.stop()
+            for subscription in self.subscriptions:
+                subscription.closed = True
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            event = json.loads(notify.payload)
+
+            for subscription in self.subscriptions_by_author.get(
+                    event['author'], ()):
+                subscription.put(event)
+
+
+def database_sync_to_async(func):
+    # Запросы потока выполняются вне обработчика запросов Django, поэтому
+    # устаревшие соединения закрываются здесь, как это делает обработчик
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper)
+
+
+def authenticate(scope):
+    headers = dict(scope['headers'])
+    header = headers.get(b'authorization')
+
+    # EventSource в браузере не умеет передавать заголовки
+    if header is None:
+        query = parse_qs(scope['query_string'].decode())
+        if 'token' not in query:
+            return None
+        header = f'Bearer {query["token"][0]}'.encode()
+
+    authentication = JWTAuthentication()
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    try:
+        return authentication.get_user(
+            authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def get_followed_authors(user):
+    return frozenset(Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True))
+
+
+def get_missed_books(user, authors, last_event_id):
+    queryset = Book.objects.exclude_hidden_authors().filter(
+        author__in=authors, id__gt=last_event_id)
+
+    if not user.is_staff:
+        queryset = queryset.filter(publication_year__lte=datetime.now().year)
+
+    rows = queryset.order_by('id').values_list(
+        'id', 'name', 'author_id', 'language_id',
+        'publication_year')[:REPLAY_LIMIT]
+
+    return [dict(zip(EVENT_FIELDS, row)) for row in rows]
+
+
+def is_event_visible(user, event):
+    if not user.is_staff and event['publication_year'] > datetime.now().year:
+        return False
+
+    # Автор мог быть скрыт после подписки, кеш хранит только видимых
+    return author_cache.get(event['author']) is not None
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def send_json(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps(data, ensure_ascii=False).encode(),
+    })
+
+
+def format_event(event):
+    data = json.dumps(event, ensure_ascii=False)
+
+    return f'id: {event["id"]}\nevent: book\ndata: {data}\n\n'.encode()
+
+
+class BookStreamApplication:
+    """ASGI-обертка, отдающая поток новых книг по Server-Sent Events.
+
+    Остальные запросы передаются приложению Django. Открытый поток не
+    занимает ни воркер, ни соединение с БД: запросы к БД выполняются
+    только при подключении и при периодическом обновлении подписок.
+    """
+
+    def __init__(self, application, path=BOOK_STREAM_PATH):
+        self.application = application
+        self.path = path
+        self.listener = BookListener()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+
+        if scope['method'] != 'GET':
+            return await send_json(
+                send, 405, {'detail': f'Метод "{scope["method"]}" не '
+                                      f'разрешен.'})
+
+        user = await database_sync_to_async(authenticate)(scope)
+        if user is None:
+            return await send_json(
+                send, 401, {'detail': 'Учетные данные не были предоставлены.'})
+
+        await self.stream(user, scope, receive, send)
+
+    async def stream(self, user, scope, receive, send):
+        loop = asyncio.get_event_loop()
+        get_authors = database_sync_to_async(get_followed_authors)
+        is_visible = database_sync_to_async(is_event_visible)
+        subscription = self.listener.subscribe()
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+
+        try:
+            authors = await get_authors(user)
+            self.listener.follow(subscription, authors)
+            refreshed = loop.time()
+
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+
+            last_event_id = dict(scope['headers']).get(b'last-event-id')
+            if last_event_id and last_event_id.isdigit():
+                missed = await database_sync_to_async(get_missed_books)(
+                    user, authors, int(last_event_id))
+                for event in missed:
+                    await self.send_event(send, event)
+
+            while not disconnected.done() and not subscription.closed:
+                getter = asyncio.ensure_future(subscription.queue.get())
+                done, pending = await asyncio.wait(
+                    {getter, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED)
+
+                if getter in done:
+                    event = getter.result()
+                    if await is_visible(user, event):
+                        await self.send_event(send, event)
+                else:
+                    getter.cancel()
+                    if not disconnected.done():
+                        await send({'type': 'http.response.body',
+                                    'body': b': ping\n\n',
+                                    'more_body': True})
+
+                if loop.time() - refreshed > FOLLOWS_REFRESH_INTERVAL:
+                    authors = await get_authors(user)
+                    self.listener.follow(subscription, authors)
+                    refreshed = loop.time()
+
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            self.listener.unsubscribe(subscription)
+
+    @staticmethod
+    async def send_event(send, event):
+        await send({'type': 'http.response.body', 'body': format_event(event),
+                    'more_body': True})
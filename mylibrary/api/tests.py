@@ -1,14 +1,43 @@
-from datetime import datetime
-
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.shortcuts import get_object_or_404
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import include, path
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
-from rest_framework.test import APIClient, APITestCase, URLPatternsTestCase
-
-from library.models import Author, Book, Follow, Language
+from rest_framework.test import (APIClient, APITestCase,
+                                 APITransactionTestCase, URLPatternsTestCase)
+from PIL import Image
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.serializers import (AuthorSerializer, BookSerializer,
+                             LanguageSerializer)
+from api.snapshots import build_snapshot, dump_catalog, get_snapshot_path
+from api.streaming import (BOOK_STREAM_PATH, BookStreamApplication,
+                           format_event)
+from api.throttling import ScopedActionThrottle
+from api.views import BookViewSet
+from library.covers import generate_missing_thumbnails, generate_thumbnail
+from library.deletion import hide_author
+from library.models import (Author, Book, Change, Follow, Language,
+                            SimilarAuthor)
 
 User = get_user_model()
 
@@ -101,6 +130,8 @@ class APITests(APITestCase, URLPatternsTestCase):
         Follow.objects.all().delete()
         User.objects.all().delete()
 
+        super().tearDownClass()
+
     def setUp(self):
         self.user_client = APIClient()
         self.user_client.force_authenticate(user=self.user)
@@ -300,6 +331,56 @@ class APITests(APITestCase, URLPatternsTestCase):
         self.assertEqual(
             Book.objects.get(pk=item['id']).name, item['name'])
 
+    def test_staff_can_get_book_facets(self):
+        url = reverse('api:books-list')
+
+        response = self.staff_client.get(
+            url, {'search': 'Толстой', 'facets': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['facets'], {
+            'language': [{'language': self.lang_ru.pk, 'count': 2}],
+            'author': [{'author': self.author_ru.pk, 'count': 2}],
+            'decade': [{'decade': 1860, 'count': 1},
+                       {'decade': 2020, 'count': 1}],
+        })
+
+        response = self.staff_client.get(
+            url, {'language': self.lang_en.pk, 'facets': 1})
+
+        self.assertEqual(
+            response.data['facets']['decade'],
+            [{'decade': 1590, 'count': 1}])
+
+    def test_staff_can_filter_and_order_books(self):
+        url = reverse('api:books-list')
+
+        response = self.staff_client.get(url, {
+            'publication_year__gte': 1800,
+            'author__in': f'{self.author_ru.pk},{self.author_fr.pk}',
+            'ordering': '-publication_year',
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            [self.book_ru_from_future.pk, self.book_fr.pk, self.book_ru.pk])
+
+        response = self.staff_client.get(
+            url, {'ordering': 'publication_year', 'limit': 2, 'offset': 1})
+
+        self.assertEqual(response.data['count'], self.books_count_for_staff)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.book_ru.pk, self.book_fr.pk])
+
+        response = self.staff_client.get(url, {'ordering': 'name'})
+
+        self.assertEqual(
+            sorted(item['id'] for item in response.data),
+            sorted(Book.objects.values_list('pk', flat=True)))
+
     def test_staff_can_list_book(self):
         url = reverse('api:books-list')
         response = self.staff_client.get(url)
@@ -381,6 +462,17 @@ class APITests(APITestCase, URLPatternsTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], self.book_ru.name)
 
+    def test_books_pages_without_ordering_are_ordered_by_id(self):
+        url = reverse('api:books-list')
+        ids = []
+        for offset in range(self.books_count_for_user):
+            response = self.user_client.get(
+                url, {'limit': 1, 'offset': offset})
+            ids.extend(book['id'] for book in response.data['results'])
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), self.books_count_for_user)
+
     def test_user_cant_read_book_from_future(self):
         url = reverse('api:books-detail', args=[self.book_ru_from_future.pk])
         response = self.user_client.get(url)
@@ -649,6 +741,45 @@ class APITests(APITestCase, URLPatternsTestCase):
         f2.delete()
         f3.delete()
 
+    def test_user_lists_only_own_follows_newest_first(self):
+        own = [Follow.objects.create(user=self.user, author=author)
+               for author in (self.author_ru, self.author_en)]
+        Follow.objects.create(user=self.staff, author=self.author_fr)
+
+        response = self.user_client.get(reverse('api:follows-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data],
+                         [own[1].pk, own[0].pk])
+        self.assertEqual(response.data[0]['author_data']['last_name'],
+                         self.author_en.last_name)
+
+    def test_user_can_page_follows_by_cursor(self):
+        follows = [Follow.objects.create(user=self.user, author=author)
+                   for author in (self.author_ru, self.author_en,
+                                  self.author_fr)]
+
+        response = self.user_client.get(
+            reverse('api:follows-list'), {'limit': 2})
+        ids = [item['id'] for item in response.data['results']]
+        response = self.user_client.get(response.data['next'])
+        ids += [item['id'] for item in response.data['results']]
+
+        self.assertEqual(ids, [follow.pk for follow in reversed(follows)])
+        self.assertIsNone(response.data['next'])
+
+    def test_only_staff_can_list_all_follows(self):
+        Follow.objects.create(user=self.user, author=self.author_ru)
+        Follow.objects.create(user=self.staff, author=self.author_en)
+        url = reverse('api:follows-all')
+
+        self.assertEqual(self.user_client.get(url).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        response = self.staff_client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
     def test_user_can_unfollow_author(self):
         following = Follow.objects.create(
             user=self.user, author=self.author_ru)
@@ -716,6 +847,77 @@ class APITests(APITestCase, URLPatternsTestCase):
 
         others_following.delete()
 
+    def test_user_can_bulk_follow_and_unfollow(self):
+        Follow.objects.create(user=self.user, author=self.author_fr)
+        missing_author_pk = Author.objects.order_by('-pk').first().pk + 1
+
+        url = reverse('api:follows-bulk')
+        data = {
+            'follow': [self.author_ru.pk, self.author_en.pk,
+                       missing_author_pk],
+            'unfollow': [self.author_fr.pk],
+        }
+
+        for _ in range(2):
+            response = self.user_client.post(url, data)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.data['following'],
+                sorted([self.author_ru.pk, self.author_en.pk]))
+            self.assertEqual(
+                response.data['not_following'],
+                sorted([self.author_fr.pk, missing_author_pk]))
+            self.assertEqual(
+                Follow.objects.filter(user=self.user).count(), 2)
+
+        response = self.user_client.post(
+            url, {'follow': [self.author_ru.pk],
+                  'unfollow': [self.author_ru.pk]})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Follow.objects.filter(user=self.user).delete()
+
+    def test_stats_follow_book_writes(self):
+        url = reverse('api:stats-list')
+
+        response = self.staff_client.get(url, {'bucket': 100})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['books_count'], self.books_count_for_staff)
+        self.assertIn(
+            {'year': 1800, 'books_count': 2}, response.data['years'])
+
+        book = Book.objects.create(
+            name='Власть тьмы', publication_year=1887, author=self.author_ru,
+            language=self.lang_ru)
+        book.publication_year = 1901
+        book.save()
+
+        response = self.staff_client.get(
+            reverse('api:stats-histogram'),
+            {'bucket': 100, 'language': self.lang_ru.pk})
+
+        self.assertEqual(list(response.data), [
+            {'language': self.lang_ru.pk, 'year': 1800, 'books_count': 1},
+            {'language': self.lang_ru.pk, 'year': 1900, 'books_count': 1},
+            {'language': self.lang_ru.pk, 'year': 2000, 'books_count': 1},
+        ])
+
+        book.delete()
+
+        response = self.user_client.get(
+            reverse('api:stats-authors'), {'author': [self.author_ru.pk]})
+
+        self.assertEqual(list(response.data), [{
+            'author': self.author_ru.pk,
+            'books_count': Book.objects.filter(
+                author=self.author_ru,
+                publication_year__lte=datetime.now().year).count(),
+        }])
+
     def test_email_send_after_book_add(self):
         following = Follow.objects.create(
             user=self.user, author=self.author_en)
@@ -734,13 +936,772 @@ class APITests(APITestCase, URLPatternsTestCase):
         response = self.staff_client.post(book_add_url, book_add_data)
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command('run_fanout', stdout=StringIO())
+
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, mail_subject)
 
         book_add_data['author'] = self.author_ru.pk
         response = self.staff_client.post(book_add_url, book_add_data)
+        call_command('run_fanout', stdout=StringIO())
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(len(mail.outbox), 1)
 
         following.delete()
+
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.ScopedActionThrottle'],
+    'DEFAULT_THROTTLE_RATES': {'search': '2/min'},
+    'TEST_REQUEST_DEFAULT_FORMAT': 'json'
+})
+class ThrottlingTests(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'throttled', password='throttled-pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch.object(ScopedActionThrottle, 'timer', return_value=1000.0)
+    def test_search_is_throttled_with_retry_after(self, timer):
+        url = '{}?search={}'.format(reverse('api:books-list'), 'толстой')
+
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Окно началось в 960с, оба запроса в текущем окне: до 1020с лимит
+        # исчерпан, после начала нового окна вес прошлого сразу ниже лимита
+        self.assertEqual(response['Retry-After'], '20')
+
+        response = self.client.get(reverse('api:books-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sliding_window_wait(self):
+        wait = ScopedActionThrottle.get_wait(
+            num_requests=10, duration=60, elapsed=15, previous=8, current=6)
+
+        # 8 * (1 - t / 60) + 6 < 10 при t > 30, от начала окна прошло 15с
+        self.assertEqual(wait, 15)
+
+
+class ChangeFeedTests(APITransactionTestCase, URLPatternsTestCase):
+    # Лента отдает только завершенные транзакции, поэтому данные тестов
+    # должны быть закоммичены
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'reader-pass')
+        self.client.force_authenticate(user=self.user)
+
+        self.language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        self.book = Book.objects.create(
+            name='Война и Мир', publication_year=1867,
+            language=self.language, author=self.author)
+        self.book_from_future = Book.objects.create(
+            name='Книга из будущего', publication_year=datetime.now().year + 1,
+            language=self.language, author=self.author)
+
+    def get_changes(self, **params):
+        response = self.client.get(reverse('api:changes-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return response.data
+
+    @staticmethod
+    def summarize(changes):
+        return [(change['model'], change['action'], change['id'])
+                for change in changes]
+
+    def test_user_can_sync_changes_since_cursor(self):
+        data = self.get_changes()
+
+        self.assertEqual(self.summarize(data['changes']), [
+            ('language', 'create', self.language.pk),
+            ('author', 'create', self.author.pk),
+            ('book', 'create', self.book.pk),
+            ('book', 'delete', self.book_from_future.pk),
+        ])
+        self.assertEqual(data['changes'][2]['data']['name'], 'Война и Мир')
+        self.assertFalse(data['has_more'])
+
+        self.book.name = 'Анна Каренина'
+        self.book.save()
+        self.book.save()
+        language = Language.objects.create(name='Английский')
+        language_id = language.pk
+        language.delete()
+
+        data = self.get_changes(since=data['cursor'])
+
+        self.assertEqual(self.summarize(data['changes']), [
+            ('book', 'update', self.book.pk),
+            ('language', 'delete', language_id),
+        ])
+        self.assertEqual(data['changes'][0]['data']['name'], 'Анна Каренина')
+        self.assertEqual(self.get_changes(since=data['cursor'])['changes'], [])
+
+    def test_user_gets_changes_in_pages(self):
+        data = self.get_changes(limit=3)
+
+        self.assertEqual(len(data['changes']), 3)
+        self.assertTrue(data['has_more'])
+
+        data = self.get_changes(since=data['cursor'], limit=3)
+
+        self.assertEqual(self.summarize(data['changes']), [
+            ('book', 'delete', self.book_from_future.pk)])
+        self.assertFalse(data['has_more'])
+
+    def test_user_cursor_expires_with_year(self):
+        year, txid, change_id = self.get_changes()['cursor'].split(':')
+        cursor = f'{int(year) - 1}:{txid}:{change_id}'
+
+        response = self.client.get(
+            reverse('api:changes-list'), {'since': cursor})
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        response = self.client.get(
+            reverse('api:changes-list'), {'since': 'bad'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cursor_expires_after_prune(self):
+        old_cursor = self.get_changes(limit=1)['cursor']
+        cursor = self.get_changes()['cursor']
+        Change.objects.update(created=timezone.now() - timedelta(days=60))
+        self.book.name = 'Анна Каренина'
+        self.book.save()
+
+        call_command('prune_change_log', days=30, batch_size=2,
+                     stdout=StringIO())
+
+        self.assertEqual(Change.objects.count(), 2)
+        response = self.client.get(
+            reverse('api:changes-list'), {'since': old_cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        # С нуля журнал уже неполон
+        response = self.client.get(reverse('api:changes-list'))
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.summarize(
+            self.get_changes(since=cursor)['changes']),
+            [('book', 'update', self.book.pk)])
+
+
+class BookStreamTests(TransactionTestCase):
+    # Уведомления приходят только после коммита. Поток ходит в БД из
+    # отдельного потока, его соединение не должно пережить тест
+    def setUp(self):
+        patcher = mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(
+            'listener', 'listener@example.com', 'listener-pass')
+        self.language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        self.other_author = Author.objects.create(
+            first_name='Жюль', last_name='Верн')
+        Follow.objects.create(user=self.user, author=self.author)
+
+        self.application = BookStreamApplication(None)
+
+    def get_communicator(self, token=None, last_event_id=None):
+        headers = []
+        if token is not None:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        if last_event_id is not None:
+            headers.append((b'last-event-id', str(last_event_id).encode()))
+
+        return ApplicationCommunicator(self.application, {
+            'type': 'http', 'method': 'GET', 'path': BOOK_STREAM_PATH,
+            'query_string': b'', 'headers': headers})
+
+    async def test_anon_cant_open_stream(self):
+        communicator = self.get_communicator()
+        await communicator.send_input({'type': 'http.request'})
+
+        start = await communicator.receive_output(5)
+
+        self.assertEqual(start['status'], status.HTTP_401_UNAUTHORIZED)
+
+    async def test_follower_receives_new_books(self):
+        communicator = self.get_communicator(AccessToken.for_user(self.user))
+        await communicator.send_input({'type': 'http.request'})
+
+        start = await communicator.receive_output(5)
+        self.assertEqual(start['status'], status.HTTP_200_OK)
+
+        create_book = sync_to_async(Book.objects.create)
+        await create_book(
+            name='Таинственный остров', publication_year=1875,
+            language=self.language, author=self.other_author)
+        book = await create_book(
+            name='Анна Каренина', publication_year=1877,
+            language=self.language, author=self.author)
+
+        body = (await communicator.receive_output(5))['body'].decode()
+
+        self.assertTrue(body.startswith(f'id: {book.pk}\nevent: book\n'))
+        self.assertIn('Анна Каренина', body)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+        self.assertIsNone(self.application.listener.connection)
+
+    async def test_moving_book_to_other_partition_is_not_new(self):
+        book = await sync_to_async(Book.objects.create)(
+            name='Анна Каренина', publication_year=1877,
+            language=self.language, author=self.author)
+
+        communicator = self.get_communicator(AccessToken.for_user(self.user))
+        await communicator.send_input({'type': 'http.request'})
+        await communicator.receive_output(5)
+
+        book.publication_year = 1917
+        await sync_to_async(book.save)()
+        new_book = await sync_to_async(Book.objects.create)(
+            name='Воскресение', publication_year=1899,
+            language=self.language, author=self.author)
+
+        body = (await communicator.receive_output(5))['body'].decode()
+
+        self.assertTrue(body.startswith(f'id: {new_book.pk}\nevent: book\n'))
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def test_hidden_author_books_are_not_sent(self):
+        await sync_to_async(Follow.objects.create)(
+            user=self.user, author=self.other_author)
+        create_book = sync_to_async(Book.objects.create)
+        await create_book(
+            name='Таинственный остров', publication_year=1875,
+            language=self.language, author=self.other_author)
+        missed = await create_book(
+            name='Анна Каренина', publication_year=1877,
+            language=self.language, author=self.author)
+        await sync_to_async(hide_author)(self.other_author)
+
+        communicator = self.get_communicator(
+            AccessToken.for_user(self.user), last_event_id=0)
+        await communicator.send_input({'type': 'http.request'})
+        await communicator.receive_output(5)
+
+        body = (await communicator.receive_output(5))['body'].decode()
+        self.assertEqual(body, format_event({
+            'id': missed.pk, 'name': 'Анна Каренина',
+            'author': self.author.pk, 'language': self.language.pk,
+            'publication_year': 1877}).decode())
+
+        await create_book(
+            name='Двадцать тысяч лье под водой', publication_year=1870,
+            language=self.language, author=self.other_author)
+        book = await create_book(
+            name='Воскресение', publication_year=1899,
+            language=self.language, author=self.author)
+
+        body = (await communicator.receive_output(5))['body'].decode()
+        self.assertTrue(body.startswith(f'id: {book.pk}\nevent: book\n'))
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+
+class BookCoverTests(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser(
+            'cover-admin', 'cover-admin@example.com', 'admin-pass')
+        cls.user = User.objects.create_user(
+            'cover-user', 'cover-user@example.com', 'user-pass')
+        language = Language.objects.create(name='Русский')
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.book = Book.objects.create(
+            name='Война и Мир', publication_year=1867, language=language,
+            author=author)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = self.settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.url = reverse('api:books-cover', args=[self.book.pk])
+
+    @staticmethod
+    def get_image(size=(1200, 1800)):
+        content = BytesIO()
+        Image.new('RGB', size, 'navy').save(content, 'PNG')
+
+        return SimpleUploadedFile(
+            'cover.png', content.getvalue(), content_type='image/png')
+
+    def upload(self, user, file):
+        self.client.force_authenticate(user=user)
+
+        return self.client.put(
+            self.url, {'cover': file}, format='multipart')
+
+    def test_staff_can_upload_cover(self):
+        response = self.upload(self.staff, self.get_image())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['cover'].endswith(self.url))
+        self.assertIsNone(response.data['cover_thumbnail'])
+
+        generate_thumbnail(self.book.pk)
+
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.cover.name.endswith('.png'))
+        with Image.open(self.book.cover_thumbnail) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 480))
+
+    def test_missing_thumbnails_are_generated(self):
+        self.upload(self.staff, self.get_image())
+
+        out = StringIO()
+        call_command('generate_missing_thumbnails', stdout=out)
+
+        self.assertEqual(out.getvalue(), 'Построено миниатюр: 1\n')
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.cover_thumbnail.name.endswith('.jpg'))
+        self.assertEqual(generate_missing_thumbnails(), 0)
+
+    def test_cover_is_served_by_nginx(self):
+        self.upload(self.staff, self.get_image())
+        self.client.force_authenticate(user=self.user)
+
+        with self.settings(MEDIA_ACCEL_REDIRECT=True):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.book.refresh_from_db()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.book.cover.name}')
+
+    def test_cover_must_be_an_image(self):
+        file = SimpleUploadedFile('cover.png', b'not an image')
+
+        response = self.upload(self.staff, file)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cant_upload_cover(self):
+        response = self.upload(self.user, self.get_image())
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CachedRelatedFieldTests(TransactionTestCase):
+    # Внутри транзакции кеш не заполняется
+    def setUp(self):
+        self.language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        self.hidden_author = Author.objects.create(
+            first_name='Жюль', last_name='Верн', is_hidden=True)
+
+    def get_serializer(self, author):
+        return BookSerializer(data={
+            'name': 'Анна Каренина', 'publication_year': 1877,
+            'language': self.language.pk, 'author': author.pk})
+
+    def test_references_are_validated_from_cache(self):
+        self.assertTrue(self.get_serializer(self.author).is_valid())
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.get_serializer(self.author).is_valid())
+
+        serializer = self.get_serializer(self.hidden_author)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('author', serializer.errors)
+
+
+class ValuesSerializerTests(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser(
+            'values-admin', 'values-admin@example.com', 'admin-pass')
+        languages = Language.objects.bulk_create(
+            Language(name=name) for name in ('Русский', 'Английский'))
+        authors = Author.objects.bulk_create([
+            Author(first_name='Лев', last_name='Толстой'),
+            Author(first_name='Федор', middle_name='Михайлович',
+                   last_name='Достоевский'),
+        ])
+        Book.objects.bulk_create(
+            Book(name=f'Книга {number}', publication_year=1850 + number,
+                 language=languages[number % 2], author=authors[number % 2],
+                 cover=f'covers/{number}.png' if number % 3 else '',
+                 cover_thumbnail=f'covers/{number}.jpg' if number % 2 else '')
+            for number in range(6))
+
+    def assert_same_as_serializer(self, url, queryset, serializer_class):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(url)
+
+        serializer = serializer_class(
+            sorted(queryset, key=lambda item: item.pk), many=True,
+            context={'request': response.wsgi_request})
+        results = response.json()
+        if isinstance(results, dict):
+            results = results['results']
+        self.assertEqual(
+            sorted(results, key=lambda item: item['id']), serializer.data)
+        # Порядок ключей тоже совпадает
+        self.assertEqual([list(item) for item in results],
+                         [list(item) for item in serializer.data])
+
+    def test_books(self):
+        self.assert_same_as_serializer(
+            '/api/v1/books/', Book.objects.all(), BookSerializer)
+
+    def test_paginated_books_with_facets(self):
+        self.assert_same_as_serializer(
+            '/api/v1/books/?ordering=publication_year&limit=3&facets=1',
+            Book.objects.order_by('publication_year')[:3], BookSerializer)
+
+    def test_authors(self):
+        self.assert_same_as_serializer(
+            '/api/v1/authors/', Author.objects.all(), AuthorSerializer)
+
+    def test_languages(self):
+        self.assert_same_as_serializer(
+            '/api/v1/languages/', Language.objects.all(), LanguageSerializer)
+
+    def test_books_expand_author_and_language(self):
+        self.client.force_authenticate(user=self.staff)
+
+        response = self.client.get('/api/v1/books/',
+                                   {'expand': 'author,language'})
+
+        book = Book.objects.select_related('author', 'language').get(
+            pk=response.data[0]['id'])
+        self.assertEqual(response.data[0]['author'],
+                         AuthorSerializer(book.author).data)
+        self.assertEqual(response.data[0]['language'],
+                         LanguageSerializer(book.language).data)
+
+        response = self.client.get('/api/v1/books/', {'expand': 'user'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STATEMENT_TIMEOUTS={'read': 0, 'search': 50},
+                   STATEMENT_TIMEOUT_RETRY_AFTER=3)
+class StatementTimeoutTests(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            'timeouts', password='timeouts-pass', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.staff)
+
+    @staticmethod
+    def get_statement_timeout():
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def slow_filter(queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_sleep(1)')
+
+        return queryset
+
+    def test_slow_search_is_canceled(self):
+        with mock.patch.object(BookViewSet, 'filter_queryset',
+                               side_effect=self.slow_filter):
+            response = self.client.get('/api/v1/books/', {'search': 'x'})
+
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(self.get_statement_timeout(), '0')
+
+        response = self.client.get('/api/v1/statement-timeouts/')
+        self.assertEqual(response.data, [
+            {'scope': 'read', 'timeout': 0, 'canceled': 0},
+            {'scope': 'search', 'timeout': 50, 'canceled': 1},
+        ])
+
+    def test_timeout_applies_only_to_its_scope(self):
+        with mock.patch.object(BookViewSet, 'filter_queryset',
+                               side_effect=self.slow_filter):
+            response = self.client.get('/api/v1/books/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/api/v1/books/', {'search': 'x'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_statement_timeout(), '0')
+
+
+@override_settings(STATEMENT_TIMEOUTS={'read': 5000, 'search': 2000})
+class StatementTimeoutCacheTests(APITransactionTestCase, URLPatternsTestCase):
+    # Кеш справочников заполняется только вне транзакции
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('expand', password='expand-pass')
+        self.client.force_authenticate(user=self.user)
+
+        language = Language.objects.create(name='Русский')
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        Book.objects.create(name='Война и Мир', publication_year=1867,
+                            language=language, author=author)
+
+    def test_expand_reads_references_from_cache(self):
+        params = {'expand': 'author,language'}
+        self.client.get('/api/v1/books/', params)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/books/', params)
+
+        self.assertEqual(response.data[0]['language']['name'], 'Русский')
+        tables = [query['sql'].partition(' FROM ')[2].partition(' ')[0]
+                  for query in queries.captured_queries]
+        self.assertNotIn('"library_language"', tables)
+        self.assertNotIn('"library_author"', tables)
+        self.assertEqual(self.get_statement_timeout(), '0')
+
+    @staticmethod
+    def get_statement_timeout():
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            return cursor.fetchone()[0]
+
+
+class RecommendationTests(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    def test_recommendations_sum_similarity_of_followed_authors(self):
+        a, b, c, d, hidden = Author.objects.bulk_create(
+            Author(first_name='Автор', last_name=name) for name in 'ABCDE')
+        Author.objects.filter(pk=hidden.pk).update(is_hidden=True)
+        SimilarAuthor.objects.bulk_create(
+            SimilarAuthor(author=author, similar=similar, score=score,
+                          common_followers=1)
+            for author, similar, score in ((a, b, 0.9), (a, c, 0.5),
+                                           (a, hidden, 0.95), (b, c, 0.4),
+                                           (b, d, 0.3)))
+        user = User.objects.create_user('recommended')
+        Follow.objects.follow_many(user, [a.pk, b.pk])
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get('/api/v1/recommendations/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['author']['id'], round(item['score'], 3))
+             for item in response.data], [(c.pk, 0.9), (d.pk, 0.3)])
+        self.assertEqual(response.data[0]['author'],
+                         AuthorSerializer(c).data)
+
+
+@override_settings(BATCH_MAX_REQUESTS=3, BATCH_MAX_COST=6)
+class BatchTests(APITransactionTestCase, URLPatternsTestCase):
+    # В параллельном режиме запросы идут через другие соединения, поэтому
+    # данные должны быть закоммичены
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    def setUp(self):
+        # Потоки пула переживают тест, их соединения не должны
+        patcher = mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user('batch', password='batch-pass')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        language = Language.objects.create(name='Русский')
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        Book.objects.create(name='Война и Мир', publication_year=1867,
+                            language=language, author=author)
+
+    def batch(self, paths, **data):
+        return self.client.post('/api/v1/batch/', dict(
+            data, requests=[{'path': path} for path in paths]))
+
+    def test_batch_authenticates_once(self):
+        paths = ['/api/v1/books/', '/api/v1/languages/',
+                 '/api/v1/users/me/']
+
+        for parallel in (False, True):
+            with mock.patch.object(
+                    JWTAuthentication, 'get_validated_token',
+                    wraps=JWTAuthentication().get_validated_token) as decode:
+                response = self.batch(paths, parallel=parallel)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(decode.call_count, 1)
+            books, languages, me = response.data['responses']
+            self.assertEqual(books['status'], status.HTTP_200_OK)
+            self.assertEqual(books['data'][0]['name'], 'Война и Мир')
+            self.assertEqual(languages['data'][0]['name'], 'Русский')
+            self.assertEqual(me['data']['username'], 'batch')
+
+    def test_batch_limits(self):
+        response = self.batch(['/api/v1/books/'] * 4)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Два поиска стоят 10 при лимите 6
+        response = self.batch(['/api/v1/books/?search=мир'] * 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.batch(['/api/v1/batch/'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogSnapshotTests(APITransactionTestCase, URLPatternsTestCase):
+    # Журнал отдает только завершенные транзакции
+    urlpatterns = [
+        path('api/', include('api.urls')),
+    ]
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        patcher = override_settings(SNAPSHOT_ROOT=root.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        self.language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        self.book = Book.objects.create(
+            name='Война и Мир', publication_year=1867,
+            language=self.language, author=self.author)
+        Book.objects.create(
+            name='Книга из будущего', publication_year=datetime.now().year + 1,
+            language=self.language, author=self.author)
+
+    @staticmethod
+    def read_records(name):
+        with gzip.open(get_snapshot_path(name)) as file:
+            return [json.loads(line) for line in file]
+
+    def test_snapshot_is_updated_from_change_log(self):
+        manifest = build_snapshot()
+
+        self.assertEqual(
+            [(record['model'], record['id'])
+             for record in self.read_records(manifest['snapshot']['file'])],
+            [('language', self.language.pk), ('author', self.author.pk),
+             ('book', self.book.pk)])
+
+        self.author.middle_name = 'Николаевич'
+        self.author.save()
+        self.book.delete()
+        Book.objects.create(name='Анна Каренина', publication_year=1877,
+                            language=self.language, author=self.author)
+
+        updated = build_snapshot()
+
+        delta, = updated['deltas']
+        self.assertEqual(delta['from'], manifest['cursor'])
+        self.assertEqual(delta['to'], updated['cursor'])
+        self.assertEqual(
+            [(record['model'], record['action'])
+             for record in self.read_records(delta['file'])],
+            [('author', 'update'), ('book', 'delete'), ('book', 'create')])
+        # Снимок из предыдущего и дельты совпадает с построенным заново
+        self.assertEqual(
+            self.read_records(updated['snapshot']['file']),
+            [json.loads(line) for line in dump_catalog(datetime.now().year)])
+        self.assertIsNone(build_snapshot())
+
+    @override_settings(SNAPSHOT_MAX_DELTA_CHANGES=2)
+    def test_long_change_log_is_split_into_deltas(self):
+        manifest = build_snapshot()
+
+        books = [Book.objects.create(
+            name=f'Книга {number}', publication_year=1900,
+            language=self.language, author=self.author)
+            for number in range(5)]
+        # Книга из первой дельты меняется в последней
+        books[0].name = 'Книга 0, второе издание'
+        books[0].save()
+
+        updated = build_snapshot()
+
+        self.assertEqual([delta['rows'] for delta in updated['deltas']],
+                         [2, 2, 2])
+        self.assertEqual(updated['deltas'][0]['from'], manifest['cursor'])
+        for previous, delta in zip(updated['deltas'], updated['deltas'][1:]):
+            self.assertEqual(delta['from'], previous['to'])
+        self.assertEqual(
+            self.read_records(updated['snapshot']['file']),
+            [json.loads(line) for line in dump_catalog(datetime.now().year)])
+        self.assertEqual(
+            len([name for name in os.listdir(self.root)
+                 if name.startswith('catalog-')]), 2)
+
+    def test_manifest_and_files_are_served(self):
+        user = User.objects.create_user('snapshot')
+        self.client.force_authenticate(user=user)
+        manifest = build_snapshot()
+
+        response = self.client.get('/api/v1/snapshot/')
+        self.assertEqual(response.data, manifest)
+
+        response = self.client.get('/api/v1/snapshot/',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            f'/api/v1/snapshot/{manifest["snapshot"]["file"]}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(b''.join(response.streaming_content)),
+                         manifest['snapshot']['size'])
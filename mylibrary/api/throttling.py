@@ -0,0 +1,109 @@
+import math
+
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+SEARCH_SCOPE_ACTION = 'search'
+
+
+def get_scope_action(action, query_params):
+    """Действие вьюсета; список с параметром поиска считается 'search'."""
+    if action == 'list' and query_params.get(SearchFilter.search_param):
+        return SEARCH_SCOPE_ACTION
+
+    return action
+
+
+class ScopedActionThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов по действию вьюсета.
+
+    Скоуп берется из словаря `throttle_scopes` вьюсета по имени действия;
+    список с параметром поиска считается действием 'search'. Окно скользящее:
+    учитывается текущий счетчик и доля счетчика предыдущего окна. На
+    запрос приходится чтение get_many и incr, первый запрос окна вместо
+    incr создает счетчик через add. Проверка и увеличение счетчика не
+    атомарны вместе: одновременные запросы могут превысить лимит на число
+    запросов, прошедших проверку до incr.
+    """
+    cache_format = 'throttle_%(scope)s_%(ident)s_%(window)d'
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_action(self, request, view):
+        return get_scope_action(getattr(view, 'action', None),
+                                request.query_params)
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, 'throttle_scopes', None) or {}
+
+        return scopes.get(self.get_action(request, view))
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user{request.user.pk}'
+
+        return f'ip{super().get_ident(request)}'
+
+    def get_window_key(self, window):
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.ident, 'window': window}
+
+    @staticmethod
+    def get_wait(num_requests, duration, elapsed, previous, current):
+        if current < num_requests:
+            remaining = (num_requests - current) / previous
+            wait = duration * (1 - remaining) - elapsed
+        else:
+            wait = duration - elapsed + duration * (1 - num_requests / current)
+
+        return max(wait, 1)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if self.scope is None:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        basename = getattr(view, 'basename', None) or view.__class__.__name__
+        self.ident = f'{basename}_{self.get_ident(request)}'
+
+        now = self.timer()
+        window = math.floor(now / self.duration)
+        elapsed = now - window * self.duration
+
+        current_key = self.get_window_key(window)
+        previous_key = self.get_window_key(window - 1)
+
+        counters = self.cache.get_many([current_key, previous_key])
+        current = counters.get(current_key, 0)
+        previous = counters.get(previous_key, 0)
+
+        estimate = previous * (1 - elapsed / self.duration) + current
+        if estimate >= self.num_requests:
+            self.wait_seconds = self.get_wait(
+                self.num_requests, self.duration, elapsed, previous, current)
+            return False
+
+        if current_key not in counters and self.cache.add(
+                current_key, 1, self.duration * 2):
+            return True
+
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Ключ истек или вытеснен после get_many
+            self.cache.set(current_key, 1, self.duration * 2)
+
+        return True
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,125 @@
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, DatabaseError, OperationalError,
+                       connections, transaction)
+
+from api.throttling import get_scope_action
+from core import tracing
+
+logger = logging.getLogger(__name__)
+
+QUERY_CANCELED = '57014'
+CANCELED_KEY = 'statement_timeout_canceled_%s'
+
+
+def is_query_canceled(exc):
+    # psycopg2 кладет код ошибки PostgreSQL в исключение, которое Django
+    # оборачивает в OperationalError
+    return (isinstance(exc, OperationalError)
+            and getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED)
+
+
+def set_statement_timeout(connection, timeout, is_local=False):
+    """Ставит statement_timeout и возвращает прежнее значение."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT current_setting('statement_timeout'), "
+            "set_config('statement_timeout', %s, %s)",
+            [str(timeout), is_local])
+        return cursor.fetchone()[0]
+
+
+@contextmanager
+def statement_timeout(timeout, using=DEFAULT_DB_ALIAS):
+    """Ограничивает каждый запрос к БД в блоке timeout миллисекунд.
+
+    Лимит ставится на сессию, а не в отдельной транзакции: чтения идут в
+    автокоммите, и кеш справочников (library.cache) заполняется как
+    обычно. На выходе возвращается прежнее значение. Внутри внешней
+    транзакции (тесты, ATOMIC_REQUESTS) блок выполняется в точке
+    сохранения, чтобы прерванный запрос откатил только ее.
+    """
+    connection = connections[using]
+
+    if connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            previous = set_statement_timeout(connection, timeout, True)
+
+            yield
+
+            # После RELEASE SAVEPOINT лимит остался бы до конца транзакции
+            if not connection.needs_rollback:
+                set_statement_timeout(connection, previous, True)
+        return
+
+    previous = set_statement_timeout(connection, timeout)
+    try:
+        yield
+    finally:
+        try:
+            set_statement_timeout(connection, previous)
+        except DatabaseError:
+            # Соединение с чужим лимитом не должно достаться другим запросам
+            connection.close()
+
+
+def count_canceled(scope):
+    key = CANCELED_KEY % scope
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_canceled_counts():
+    keys = {scope: CANCELED_KEY % scope
+            for scope in settings.STATEMENT_TIMEOUTS}
+    counts = cache.get_many(keys.values())
+
+    return {scope: counts.get(key, 0) for scope, key in keys.items()}
+
+
+class StatementTimeoutMixin:
+    """Ограничение времени запросов к БД по действию вьюсета.
+
+    Бюджет берется из STATEMENT_TIMEOUTS по скоупу из словаря
+    `statement_timeout_scopes` вьюсета, как у ScopedActionThrottle. Лимит
+    действует на все запросы к БД за время обработки, отмененный запрос
+    превращается в ответ 503 (см. api.exceptions.exception_handler).
+    """
+    statement_timeout_scopes = {}
+
+    def get_statement_timeout_scope(self, request):
+        action = self.action_map.get(request.method.lower())
+
+        return self.statement_timeout_scopes.get(
+            get_scope_action(action, request.GET))
+
+    def dispatch(self, request, *args, **kwargs):
+        self.statement_timeout_scope = self.get_statement_timeout_scope(
+            request)
+        timeout = settings.STATEMENT_TIMEOUTS.get(
+            self.statement_timeout_scope)
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        if not timeout or connection.vendor != 'postgresql':
+            return super().dispatch(request, *args, **kwargs)
+
+        with statement_timeout(timeout):
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_query_canceled(self):
+        scope = self.statement_timeout_scope
+        logger.warning('Запрос %s.%s прерван по statement_timeout (%s)',
+                       type(self).__name__, self.action, scope)
+
+        current = tracing.get_current_span()
+        if current is not None:
+            current.attributes['db.statement_timeout.scope'] = scope or ''
+
+        if scope is not None:
+            count_canceled(scope)
@@ -0,0 +1,53 @@
+from rest_framework import serializers
+
+from core import tracing
+
+SERIALIZE_SPAN = 'serialize'
+
+
+def in_serialize_span():
+    current = tracing.get_current_span()
+
+    return current is None or current.name == SERIALIZE_SPAN
+
+
+class TracedListSerializer(serializers.ListSerializer):
+    """Один спан на весь список вместо спана на каждый объект."""
+
+    def to_representation(self, data):
+        if in_serialize_span():
+            return super().to_representation(data)
+
+        with tracing.span(SERIALIZE_SPAN, **{
+                'serializer.class': type(self.child).__name__,
+                'serializer.many': True}) as span:
+            representation = super().to_representation(data)
+            span.attributes['serializer.count'] = len(representation)
+
+        return representation
+
+
+class TracedSerializerMixin:
+    def to_representation(self, instance):
+        # Вложенные сериализаторы входят в спан внешнего
+        if in_serialize_span():
+            return super().to_representation(instance)
+
+        with tracing.span(SERIALIZE_SPAN, **{
+                'serializer.class': type(self).__name__}):
+            return super().to_representation(instance)
+
+
+class TracedPermissionsMixin:
+    def get_span_attributes(self):
+        return {'view': type(self).__name__,
+                'view.action': getattr(self, 'action', None) or ''}
+
+    def check_permissions(self, request):
+        with tracing.span('permissions', **self.get_span_attributes()):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with tracing.span('object_permissions',
+                          **self.get_span_attributes()):
+            super().check_object_permissions(request, obj)
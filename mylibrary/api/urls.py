@@ -1,19 +1,31 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (AuthorViewSet, BookViewSet, FollowViewSet,
-                       LanguageViewSet)
+from api.batch import BatchView
+from api.views import (AuthorViewSet, BookViewSet, ChangeViewSet,
+                       FollowViewSet, LanguageViewSet, ProfileViewSet,
+                       RecommendationViewSet, SnapshotViewSet,
+                       StatementTimeoutViewSet, StatsViewSet)
 
 app_name = 'api'
 
 router = routers.DefaultRouter()
 router.register('authors', AuthorViewSet, basename='authors')
 router.register('books', BookViewSet, basename='books')
+router.register('changes', ChangeViewSet, basename='changes')
 router.register('follows', FollowViewSet, basename='follows')
 router.register('languages', LanguageViewSet, basename='languages')
+router.register('profiles', ProfileViewSet, basename='profiles')
+router.register('recommendations', RecommendationViewSet,
+                basename='recommendations')
+router.register('snapshot', SnapshotViewSet, basename='snapshot')
+router.register('stats', StatsViewSet, basename='stats')
+router.register('statement-timeouts', StatementTimeoutViewSet,
+                basename='statement-timeouts')
 
 urlpatterns = [
     path('v1/', include('djoser.urls')),
     path('v1/', include('djoser.urls.jwt')),
+    path('v1/batch/', BatchView.as_view(), name='batch'),
     path('v1/', include(router.urls)),
 ]
@@ -0,0 +1,141 @@
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from api.tracing import SERIALIZE_SPAN
+from core import tracing
+
+# Поля, у которых to_representation не меняет значение из БД
+IDENTITY_FIELDS = (serializers.BooleanField, serializers.CharField,
+                   serializers.IntegerField,
+                   serializers.PrimaryKeyRelatedField)
+UNSUPPORTED_FIELDS = (serializers.FileField, serializers.SerializerMethodField,
+                      serializers.BaseSerializer,
+                      serializers.RelatedField, serializers.ManyRelatedField)
+
+
+def convert_not_none(index, convert):
+    def mapper(row):
+        value = row[index]
+        return None if value is None else convert(value)
+
+    return mapper
+
+
+def apply_to_columns(indexes, func):
+    def mapper(row):
+        return func(*[row[index] for index in indexes])
+
+    return mapper
+
+
+class ValuesSerializer:
+    """Сериализация списка из кортежей values_list без модели и полей DRF.
+
+    Разбирает поля сериализатора один раз: для каждого поля запоминается
+    столбец выборки и, если значение нужно преобразовать, функция
+    преобразования. Строка превращается в словарь через itemgetter и zip,
+    а преобразования применяются поверх, не меняя порядок ключей. Результат
+    совпадает с serializer.data.
+
+    Поля, которые нельзя получить из одного столбца, сериализатор описывает
+    методом get_values_mappers: {поле: (столбцы, функция от их значений)}.
+    """
+
+    def __init__(self, serializer):
+        self.serializer_name = type(serializer).__name__
+        self.columns = []
+        self.names = []
+        self.mappers = []
+
+        get_values_mappers = getattr(serializer, 'get_values_mappers', None)
+        custom = get_values_mappers() if get_values_mappers else {}
+
+        indexes = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            self.names.append(name)
+            if name in custom:
+                columns, func = custom[name]
+                column_indexes = [self.get_index(column)
+                                  for column in columns]
+                indexes.append(column_indexes[0])
+                self.mappers.append(
+                    (name, apply_to_columns(column_indexes, func)))
+                continue
+
+            indexes.append(self.get_index(self.get_column(name, field)))
+            if not isinstance(field, IDENTITY_FIELDS):
+                self.mappers.append(
+                    (name, convert_not_none(indexes[-1],
+                                            field.to_representation)))
+
+        if len(indexes) == 1:
+            index = indexes[0]
+            self.getter = lambda row: (row[index], )
+        else:
+            self.getter = itemgetter(*indexes)
+
+    def get_column(self, name, field):
+        if (isinstance(field, UNSUPPORTED_FIELDS)
+                and not isinstance(field, serializers.PrimaryKeyRelatedField)
+                or field.source == '*' or '.' in field.source):
+            raise ImproperlyConfigured(
+                f'Поле {self.serializer_name}.{name} нельзя получить из '
+                f'values_list, опишите его в get_values_mappers')
+        if getattr(field, 'pk_field', None) is not None:
+            raise ImproperlyConfigured(
+                f'Поле {self.serializer_name}.{name} с pk_field не '
+                f'поддерживается')
+
+        return field.source
+
+    def get_index(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+        return self.columns.index(column)
+
+    def get_queryset(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def to_representation(self, rows):
+        names, getter, mappers = self.names, self.getter, self.mappers
+
+        with tracing.span(SERIALIZE_SPAN, **{
+                'serializer.class': self.serializer_name,
+                'serializer.many': True,
+                'serializer.values': True}):
+            data = []
+            for row in rows:
+                item = dict(zip(names, getter(row)))
+                for name, mapper in mappers:
+                    item[name] = mapper(row)
+                data.append(item)
+
+        return data
+
+
+class ValuesListMixin:
+    """list, отдающий данные через ValuesSerializer."""
+
+    def get_values_serializer(self):
+        return ValuesSerializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        return self.list_values(self.filter_queryset(self.get_queryset()))
+
+    def list_values(self, queryset):
+        serializer = self.get_values_serializer()
+        rows = serializer.get_queryset(queryset)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.to_representation(page))
+
+        return Response(serializer.to_representation(rows))
@@ -1,81 +1,510 @@
+import mimetypes
+import os
 from datetime import datetime
+from functools import partial
 
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, IntegerField, Sum
+from django.http import FileResponse, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, mixins, permissions, viewsets
+from rest_framework import filters, mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FileUploadParser, MultiPartParser
+from rest_framework.response import Response
 
+from api.changes import get_change_results
+from api.exceptions import PayloadTooLarge, ResyncRequired
+from api.expand import ExpandMixin
+from api.filters import BookFilter, StableOrderingFilter
+from api.pagination import CreatedKeysetPagination
 from api.permissions import AdminWriteAccessPermission, DataAccessPermission
-from api.serializers import (AuthorSerializer, BookSerializer,
-                             FollowSerializer, LanguageSerializer)
-from core.email import send_email_using_bcc
-from library.models import Author, Book, Follow, Language
+from api.serializers import (AuthorSerializer, AuthorStatsQuerySerializer,
+                             BookSerializer, ChangeCursorField,
+                             ChangeQuerySerializer, FollowBulkSerializer,
+                             FollowSerializer, LanguageSerializer,
+                             RecommendationQuerySerializer,
+                             StatsQuerySerializer)
+from api.snapshots import get_snapshot_path, read_manifest
+from api.timeouts import StatementTimeoutMixin, get_canceled_counts
+from api.tracing import TracedPermissionsMixin
+from api.values import ValuesListMixin
+from core.profiling import get_profile_path, get_profiles
+from library.cache import author_cache, language_cache
+from library.covers import (COVER_FORMATS, delete_files, get_cover_format,
+                            get_cover_name, schedule_thumbnail)
+from library.deletion import hide_author
+from library.models import (Author, AuthorYearStat, Book, Change, FanoutJob,
+                            Follow, Language, LanguageYearStat,
+                            SimilarAuthor)
+from webhooks.models import BOOK_CREATED, enqueue_event
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(TracedPermissionsMixin, StatementTimeoutMixin,
+                    ValuesListMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = (AdminWriteAccessPermission,
                           permissions.IsAuthenticated)
+    throttle_scopes = {'create': 'create'}
+    statement_timeout_scopes = {'list': 'read', 'retrieve': 'read'}
 
+    def perform_destroy(self, instance):
+        # Книги и подписки удаляет purge_hidden_authors
+        hide_author(instance)
 
-class BookViewSet(viewsets.ModelViewSet):
+
+class BookViewSet(TracedPermissionsMixin, StatementTimeoutMixin, ExpandMixin,
+                  ValuesListMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (AdminWriteAccessPermission,
                           permissions.IsAuthenticated)
-    filter_backends = (filters.SearchFilter, DjangoFilterBackend)
+    filter_backends = (filters.SearchFilter, DjangoFilterBackend,
+                       StableOrderingFilter)
     search_fields = ('@name', '@author__last_name', '@author__first_name')
-    filterset_fields = ('language', 'author')
+    filterset_class = BookFilter
+    ordering_fields = ('publication_year', 'created')
+    throttle_scopes = {'create': 'create', 'search': 'search'}
+    statement_timeout_scopes = {'list': 'read', 'retrieve': 'read',
+                                'search': 'search'}
+    facets_param = 'facets'
+    facets_limit = 100
+    expand_fields = {
+        'author': (author_cache, AuthorSerializer),
+        'language': (language_cache, LanguageSerializer),
+    }
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Book.objects.none()
+
+        queryset = Book.objects.exclude_hidden_authors()
+
         if self.request.user.is_staff:
-            return Book.objects.all()
+            return queryset
+
+        return queryset.filter(publication_year__lte=datetime.now().year)
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get(self.facets_param):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = queryset.facet_counts(limit=self.facets_limit)
+
+        response = self.list_values(queryset)
+        if isinstance(response.data, list):
+            response.data = {'results': response.data}
+        response.data['facets'] = facets
+
+        return response
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+
+        # Обложка пишется частями во временный файл, а не в память, и затем
+        # переносится в MEDIA_ROOT переименованием
+        if self.action == 'cover':
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+
+        return drf_request
+
+    @action(detail=True, methods=['get', 'put', 'delete'],
+            parser_classes=(MultiPartParser, FileUploadParser))
+    def cover(self, request, pk=None):
+        book = self.get_object()
+
+        if request.method == 'GET':
+            return self.get_cover_response(
+                book, request.query_params.get('size'))
+
+        old_names = [book.cover.name, book.cover_thumbnail.name]
+
+        if request.method == 'DELETE':
+            self.update_cover(book, '')
+            transaction.on_commit(partial(delete_files, old_names))
+
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.BOOK_COVER_MAX_SIZE:
+            raise PayloadTooLarge()
+
+        file = request.data.get('file') or request.data.get('cover')
+        if file is None:
+            raise ValidationError({'cover': 'Файл обложки не передан'})
+        if file.size > settings.BOOK_COVER_MAX_SIZE:
+            raise PayloadTooLarge()
+
+        image_format = get_cover_format(file)
+        if image_format is None:
+            raise ValidationError(
+                {'cover': 'Обложка должна быть изображением JPEG, PNG или '
+                          'WEBP'})
+
+        name = default_storage.save(
+            get_cover_name(book.pk, COVER_FORMATS[image_format]), file)
+        self.update_cover(book, name)
+        transaction.on_commit(partial(delete_files, old_names))
+        transaction.on_commit(partial(schedule_thumbnail, book.pk))
+
+        return Response(self.get_serializer(book).data)
+
+    @staticmethod
+    def update_cover(book, name):
+        # Год публикации сужает UPDATE до одной секции
+        Book.objects.filter(
+            pk=book.pk, publication_year=book.publication_year).update(
+            cover=name, cover_thumbnail='')
+        book.cover.name = name
+        book.cover_thumbnail.name = ''
+
+    @staticmethod
+    def get_cover_response(book, size):
+        image = book.cover_thumbnail if size == 'thumbnail' else book.cover
+        if not image:
+            raise NotFound('Обложка не загружена')
+
+        content_type, encoding = mimetypes.guess_type(image.name)
 
-        return Book.objects.filter(publication_year__lte=datetime.now().year)
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = (
+                f'{settings.MEDIA_ACCEL_PREFIX}{image.name}')
+
+            return response
+
+        return FileResponse(image.open('rb'), content_type=content_type)
 
     def perform_create(self, serializer):
-        serializer.save()
+        with transaction.atomic():
+            book = serializer.save()
+            enqueue_event(BOOK_CREATED, serializer.data)
+            # Письма рассылает команда run_fanout, запрос только ставит
+            # задание в очередь
+            self.create_fanout_job(book)
 
-        data = serializer.data
-        publication_year = data['publication_year']
+    @staticmethod
+    def create_fanout_job(book):
+        publication_year = book.publication_year
         current_year = datetime.now().year
 
         if publication_year > current_year:
             return None
 
-        author = Author.objects.get(pk=data['author'])
-        book_name = data['name']
-
-        followers = author.followers.all()
+        author = book.author
 
-        if not followers:
+        if not author.followers.exists():
             return None
 
-        send_email_using_bcc(
-            subject=f'Доступна книга "{book_name}" ({author})',
+        return FanoutJob.objects.create(
+            author=author, book=book,
+            subject=f'Доступна книга "{book.name}" ({author})',
             message='Привет!\n\n'
                     'Только что на нашем сервисе появилась новая книга от '
                     f'{author}!\n\n'
-                    f'{book_name}, {publication_year}г.\n\n'
+                    f'{book.name}, {publication_year}г.\n\n'
                     '---'
-                    f'\n© {current_year}, Сервис библиотеки ',
-            recipient_list=[follower.user.email for follower in followers])
+                    f'\n© {current_year}, Сервис библиотеки ')
 
 
-class FollowViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin,
-                    mixins.ListModelMixin, mixins.DestroyModelMixin,
-                    mixins.RetrieveModelMixin):
+class FollowViewSet(TracedPermissionsMixin, StatementTimeoutMixin,
+                    viewsets.GenericViewSet,
+                    mixins.CreateModelMixin, mixins.ListModelMixin,
+                    mixins.DestroyModelMixin, mixins.RetrieveModelMixin):
+    """Подписки на авторов.
+
+    list отдает только подписки пользователя, от новых к старым, all -
+    подписки всех пользователей (для сотрудников). С ?limit= список
+    листается по курсору из поля next.
+    """
     queryset = Follow.objects.all()
     serializer_class = FollowSerializer
     permission_classes = (DataAccessPermission, permissions.IsAuthenticated)
     filter_backends = (DjangoFilterBackend, )
     filterset_fields = ('user', 'author')
+    pagination_class = CreatedKeysetPagination
+    throttle_scopes = {'create': 'follow', 'destroy': 'follow',
+                       'bulk': 'follow'}
+    statement_timeout_scopes = {'list': 'read', 'all': 'read'}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Follow.objects.none()
+
+        queryset = Follow.objects.select_related('author')
+
+        # Читается по индексу (user, created, id), а не всей таблицей
+        if self.action == 'list':
+            queryset = queryset.filter(user=self.request.user,
+                                       author__is_hidden=False)
+
+        return queryset.order_by('-created', '-id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, permission_classes=(permissions.IsAdminUser, ))
+    def all(self, request):
+        return self.list(request)
+
+    @action(detail=False, methods=['post'],
+            serializer_class=FollowBulkSerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        follow = serializer.validated_data['follow']
+        unfollow = serializer.validated_data['unfollow']
+        user_follows = Follow.objects.filter(user=request.user)
+
+        with transaction.atomic():
+            if follow:
+                Follow.objects.follow_many(request.user, follow)
+            if unfollow:
+                user_follows.filter(author_id__in=unfollow).delete()
 
-class LanguageViewSet(viewsets.ModelViewSet):
+        following = set(user_follows.filter(
+            author_id__in=follow + unfollow).values_list(
+            'author_id', flat=True))
+
+        return Response({
+            'following': sorted(following),
+            'not_following': sorted(set(follow + unfollow) - following),
+        })
+
+
+class LanguageViewSet(TracedPermissionsMixin, ValuesListMixin,
+                      viewsets.ModelViewSet):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
     permission_classes = (AdminWriteAccessPermission,
                           permissions.IsAuthenticated)
+    throttle_scopes = {'create': 'create'}
+
+
+class StatsViewSet(TracedPermissionsMixin, StatementTimeoutMixin,
+                   viewsets.ViewSet):
+    """Статистика каталога.
+
+    Читается из сводных таблиц, которые триггеры обновляют при каждой
+    записи в книги, поэтому время ответа не зависит от числа книг.
+    """
+    statement_timeout_scopes = {'list': 'read', 'histogram': 'read',
+                                'authors': 'read'}
+
+    def get_stats(self, queryset):
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(
+                publication_year__lte=datetime.now().year)
+
+        return queryset.filter(books_count__gt=0)
+
+    def get_query(self, serializer_class):
+        serializer = serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        return serializer.validated_data
+
+    @staticmethod
+    def annotate_bucket(queryset, bucket):
+        return queryset.annotate(year=ExpressionWrapper(
+            F('publication_year') / bucket * bucket,
+            output_field=IntegerField()))
+
+    def list(self, request):
+        query = self.get_query(StatsQuerySerializer)
+        stats = self.get_stats(LanguageYearStat.objects.all())
+
+        languages = list(stats.values('language').annotate(
+            books_count=Sum('books_count')).order_by('language'))
+        years = self.annotate_bucket(stats, query['bucket']).values(
+            'year').annotate(books_count=Sum('books_count')).order_by('year')
+
+        return Response({
+            'books_count': sum(item['books_count'] for item in languages),
+            'languages': languages,
+            'years': list(years),
+        })
+
+    @action(detail=False)
+    def histogram(self, request):
+        query = self.get_query(StatsQuerySerializer)
+        stats = self.get_stats(LanguageYearStat.objects.all())
+
+        if 'language' in query:
+            stats = stats.filter(language=query['language'])
+
+        histogram = self.annotate_bucket(stats, query['bucket']).values(
+            'language', 'year').annotate(
+            books_count=Sum('books_count')).order_by('language', 'year')
+
+        return Response(list(histogram))
+
+    @action(detail=False)
+    def authors(self, request):
+        query = self.get_query(AuthorStatsQuerySerializer)
+        stats = self.get_stats(AuthorYearStat.objects.all())
+
+        if query.get('author'):
+            stats = stats.filter(author__in=query['author'])
+
+        authors = stats.values('author').annotate(
+            books_count=Sum('books_count')).order_by(
+            '-books_count', 'author')[:query['limit']]
+
+        return Response(list(authors))
+
+
+class RecommendationViewSet(TracedPermissionsMixin, StatementTimeoutMixin,
+                            viewsets.ViewSet):
+    """Авторы, похожие на тех, на кого подписан пользователь.
+
+    Ответ строится одним запросом по индексу таблицы SimilarAuthor:
+    сходства суммируются по подпискам пользователя, авторы, на которых он
+    уже подписан, исключаются. Данные авторов берутся из кеша.
+    """
+    statement_timeout_scopes = {'list': 'read'}
+
+    def list(self, request):
+        serializer = RecommendationQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        followed = Follow.objects.filter(user=request.user).values('author')
+        recommendations = list(SimilarAuthor.objects.filter(
+            author__in=followed, similar__is_hidden=False).exclude(
+            similar__in=followed).values('similar').annotate(
+            score=Sum('score')).order_by('-score', 'similar')[
+            :serializer.validated_data['limit']])
+
+        authors = author_cache.get_many(
+            [item['similar'] for item in recommendations])
+
+        return Response([
+            {'author': AuthorSerializer(authors[item['similar']]).data,
+             'score': item['score']}
+            for item in recommendations if item['similar'] in authors])
+
+
+class ChangeViewSet(TracedPermissionsMixin, StatementTimeoutMixin,
+                    viewsets.ViewSet):
+    """Лента изменений каталога для инкрементальной синхронизации.
+
+    Записи журнала отдаются по возрастанию курсора вместе с текущими данными
+    объектов. Удаленные объекты и скрытые от пользователя книги приходят как
+    delete. Курсор обычного пользователя действует до конца года: в новом
+    году открываются книги, о которых лента не сообщала.
+    """
+    statement_timeout_scopes = {'list': 'read'}
+
+    def list(self, request):
+        serializer = ChangeQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        year = datetime.now().year
+        txid, change_id = 0, 0
+        if 'since' in query:
+            since_year, txid, change_id = query['since']
+            if since_year != year and not request.user.is_staff:
+                raise ResyncRequired()
+        # После очистки журнала с нуля синхронизируются по снимку каталога
+        if Change.objects.is_pruned(txid, change_id):
+            raise ResyncRequired()
+
+        changes = list(Change.objects.committed().after(
+            txid, change_id).order_by('txid', 'id')[:query['limit'] + 1])
+        has_more = len(changes) > query['limit']
+        changes = changes[:query['limit']]
+
+        if changes:
+            txid, change_id = changes[-1].txid, changes[-1].id
+
+        results = get_change_results(changes, year, request.user.is_staff)
+
+        return Response({
+            'changes': results,
+            'cursor': ChangeCursorField().to_representation(
+                (year, txid, change_id)),
+            'has_more': has_more,
+        })
+
+
+class SnapshotViewSet(TracedPermissionsMixin, viewsets.ViewSet):
+    """Снимок каталога для первой синхронизации.
+
+    list отдает манифест: файл снимка с курсором ленты изменений и дельты,
+    которые переводят более старый снимок к текущему. Файлы неизменяемы и
+    отдаются nginx (ETag, Range) через X-Accel-Redirect.
+    """
+    lookup_value_regex = r'(?:catalog|delta)-[0-9]+-[0-9]+-[0-9]+\.jsonl\.gz'
+
+    def list(self, request):
+        manifest = read_manifest()
+        if manifest is None:
+            raise NotFound('Снимок каталога еще не построен')
+
+        etag = f'"{manifest["cursor"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(manifest)
+        response['ETag'] = etag
+
+        return response
+
+    def retrieve(self, request, pk=None):
+        path = get_snapshot_path(pk)
+        if not os.path.exists(path):
+            raise NotFound()
+
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type='application/gzip')
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + (
+                os.path.relpath(path, settings.MEDIA_ROOT))
+        else:
+            response = FileResponse(open(path, 'rb'),
+                                    content_type='application/gzip')
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+
+        return response
+
+
+class ProfileViewSet(TracedPermissionsMixin, viewsets.ViewSet):
+    """Профили запросов, снятые по заголовку X-Profile.
+
+    Профиль отдается в формате collapsed stacks: его открывают speedscope
+    или flamegraph.pl.
+    """
+    permission_classes = (permissions.IsAdminUser, )
+    lookup_value_regex = '[0-9a-f]{32}'
+
+    def list(self, request):
+        return Response(get_profiles())
+
+    def retrieve(self, request, pk=None):
+        try:
+            file = open(get_profile_path(pk, 'folded'), 'rb')
+        except FileNotFoundError:
+            raise NotFound()
+
+        return FileResponse(file, as_attachment=True,
+                            filename=f'profile-{pk}.folded',
+                            content_type='text/plain; charset=utf-8')
+
+
+class StatementTimeoutViewSet(TracedPermissionsMixin, viewsets.ViewSet):
+    """Лимиты времени запросов к БД и число прерванных по ним запросов."""
+    permission_classes = (permissions.IsAdminUser, )
+
+    def list(self, request):
+        canceled = get_canceled_counts()
+
+        return Response([
+            {'scope': scope, 'timeout': timeout, 'canceled': canceled[scope]}
+            for scope, timeout in sorted(settings.STATEMENT_TIMEOUTS.items())
+        ])
@@ -1,8 +1,10 @@
 from django.core import mail
 
+from core import tracing
+
 
 def send_email_using_bcc(subject, message, recipient_list, from_email=None,
-                         reply_to=None):
+                         reply_to=None, fail_silently=True):
 
     if not from_email or not recipient_list or not message or not subject:
         return False
@@ -11,6 +13,8 @@ def send_email_using_bcc(subject, message, recipient_list, from_email=None,
         subject=subject, body=message, from_email=from_email,
         bcc=recipient_list, reply_to=reply_to)
 
-    email.send(fail_silently=True)
+    with tracing.span('smtp.send', tracing.SPAN_KIND_CLIENT, **{
+            'email.recipients': len(recipient_list)}):
+        email.send(fail_silently=fail_silently)
 
     return True
@@ -0,0 +1,146 @@
+import os
+import socket
+import subprocess
+import threading
+import time
+import uuid
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Профили сравнения: sync-воркеры (новое соединение на каждый запрос) и
+# gthread с keep-alive соединениями
+PROFILES = {
+    'sync': ({'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_THREADS': '1'},
+             False),
+    'gthread': ({'GUNICORN_WORKER_CLASS': 'gthread',
+                 'GUNICORN_THREADS': '4'}, True),
+}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность gunicorn с sync-воркерами '
+            'без keep-alive и с gthread-воркерами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/v1/languages/',
+                            help='Адрес, который запрашивается')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Число одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность замера для профиля, с')
+        parser.add_argument('--workers', type=int,
+                            help='Число воркеров для обоих профилей')
+        parser.add_argument('--profile', action='append',
+                            choices=list(PROFILES),
+                            help='Профиль, по умолчанию все')
+
+    def start_server(self, port, env):
+        process = subprocess.Popen(
+            ['gunicorn', 'mylibrary.wsgi:application',
+             '--config', 'python:mylibrary.gunicorn_conf',
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=dict(os.environ, **env))
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+
+        process.terminate()
+        raise CommandError('gunicorn не запустился')
+
+    def run_clients(self, url, token, keepalive, concurrency, duration):
+        headers = {'Authorization': f'Bearer {token}'}
+        # Сервер слушает 127.0.0.1, а Host проверяется по ALLOWED_HOSTS
+        hosts = [host for host in settings.ALLOWED_HOSTS
+                 if host not in ('*', '') and not host.startswith('.')]
+        if hosts:
+            headers['Host'] = hosts[0]
+        if not keepalive:
+            headers['Connection'] = 'close'
+
+        latencies = []
+        errors = []
+        deadline = time.monotonic() + duration
+
+        def client():
+            with httpx.Client(headers=headers, timeout=30) as session:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = session.get(url)
+                    except httpx.HTTPError as error:
+                        errors.append(error)
+                        continue
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+
+        threads = [threading.Thread(target=client)
+                   for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return latencies, errors
+
+    def benchmark(self, name, token, options):
+        env, keepalive = PROFILES[name]
+        env = dict(env, GUNICORN_WARMUP='1')
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+
+        port = get_free_port()
+        process = self.start_server(port, env)
+        try:
+            url = f'http://127.0.0.1:{port}{options["path"]}'
+            # Прогрев: воркеры открывают соединения с БД
+            self.run_clients(url, token, keepalive,
+                             options['concurrency'], 1)
+            latencies, errors = self.run_clients(
+                url, token, keepalive, options['concurrency'],
+                options['duration'])
+        finally:
+            process.terminate()
+            process.wait()
+
+        if not latencies:
+            raise CommandError(f'{name}: нет ни одного ответа')
+
+        self.stdout.write(
+            f'{name}: {len(latencies) / options["duration"]:.0f} запр/с, '
+            f'p50 {percentile(latencies, 0.5) * 1000:.1f} мс, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f} мс, '
+            f'ошибок {len(errors)}')
+        if errors:
+            self.stdout.write(f'Первая ошибка: {errors[0]!r}')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(
+            f'benchmark-{uuid.uuid4().hex[:12]}')
+        try:
+            token = str(AccessToken.for_user(user))
+            for name in options['profile'] or PROFILES:
+                self.benchmark(name, token, options)
+        finally:
+            user.delete()
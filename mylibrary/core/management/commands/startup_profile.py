@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILE_SCRIPT = '''
+import json
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mylibrary.settings')
+
+started = time.perf_counter()
+import mylibrary.wsgi
+timings = [('wsgi_application', time.perf_counter() - started)]
+
+if {warm_up}:
+    from core.warmup import warm_up
+    timings.extend(warm_up())
+
+print(json.dumps(timings))
+'''
+
+IMPORT_TIME_LINE = re.compile(
+    r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|'
+    r'(?P<indent>\s+)(?P<module>\S+)$')
+
+
+def parse_import_times(output):
+    modules = []
+
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+
+        modules.append((
+            match.group('module'),
+            int(match.group('self')),
+            int(match.group('cumulative')),
+        ))
+
+    return modules
+
+
+def group_by_app(modules, app_names):
+    app_names = sorted(app_names, key=len, reverse=True)
+    groups = defaultdict(int)
+
+    for module, self_time, cumulative in modules:
+        for app_name in app_names:
+            if module == app_name or module.startswith(app_name + '.'):
+                groups[app_name] += self_time
+                break
+        else:
+            groups[module.split('.')[0]] += self_time
+
+    return sorted(groups.items(), key=lambda item: item[1], reverse=True)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время импорта модулей и инициализации приложения '
+            'mylibrary.wsgi:application в отдельном процессе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько самых медленных модулей и пакетов показать')
+        parser.add_argument(
+            '--no-warmup', action='store_true',
+            help='Не выполнять прогрев после загрузки приложения')
+
+    def handle(self, *args, **options):
+        script = PROFILE_SCRIPT.format(warm_up=not options['no_warmup'])
+
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+
+        if result.returncode:
+            lines = result.stderr.strip().splitlines()
+            raise CommandError(
+                lines[-1] if lines
+                else f'Процесс завершился с кодом {result.returncode}')
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_import_times(result.stderr)
+        limit = options['limit']
+
+        self.stdout.write('Инициализация, мс:')
+        for name, seconds in timings:
+            self.stdout.write(f'  {name:<30} {seconds * 1000:>10.1f}')
+
+        self.stdout.write('Импорт по приложениям и пакетам, мс:')
+        for name, self_time in group_by_app(
+                modules, settings.INSTALLED_APPS)[:limit]:
+            self.stdout.write(f'  {name:<30} {self_time / 1000:>10.1f}')
+
+        self.stdout.write('Самые медленные модули (суммарно), мс:')
+        for module, self_time, cumulative in sorted(
+                modules, key=lambda item: item[2], reverse=True)[:limit]:
+            self.stdout.write(f'  {module:<50} {cumulative / 1000:>10.1f}')
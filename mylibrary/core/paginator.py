@@ -0,0 +1,58 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def get_table_estimate(model, using='default'):
+    # Для секционированной таблицы оценка хранится у секций
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint '
+            'FROM pg_class c '
+            'WHERE c.oid = %s::regclass OR c.oid IN ('
+            '    SELECT inhrelid FROM pg_inherits '
+            '    WHERE inhparent = %s::regclass)',
+            [model._meta.db_table, model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def get_query_estimate(queryset):
+    sql, params = queryset.query.sql_with_params()
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не делает COUNT(*) по большим таблицам.
+
+    Без фильтров число строк берется из pg_class, с фильтрами - из оценки
+    планировщика. Точный COUNT(*) выполняется, только если оценка меньше
+    exact_count_threshold.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        if queryset.query.where:
+            estimate = get_query_estimate(queryset)
+        else:
+            estimate = get_table_estimate(queryset.model, queryset.db)
+
+        if estimate < self.exact_count_threshold:
+            return super().count
+
+        return int(estimate)
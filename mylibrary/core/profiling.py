@@ -0,0 +1,174 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+MAX_STACK_DEPTH = 200
+
+
+def get_frame_name(frame):
+    module = frame.f_globals.get('__name__', '?')
+
+    return f'{module}.{frame.f_code.co_name}'
+
+
+def get_stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Сэмплирующий профилировщик одного потока.
+
+    Фоновый поток с заданным интервалом снимает стек профилируемого потока
+    через sys._current_frames и считает одинаковые стеки. Время ожидания
+    БД и сети тоже попадает в профиль.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiler',
+                                       daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[get_stack(frame)] += 1
+
+    def to_collapsed(self):
+        # Формат collapsed stacks для flamegraph.pl и speedscope
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def get_profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILING_ROOT, f'{profile_id}.{extension}')
+
+
+def get_profiles():
+    if not os.path.isdir(settings.PROFILING_ROOT):
+        return []
+
+    profiles = []
+    for name in os.listdir(settings.PROFILING_ROOT):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILING_ROOT, name)) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+
+    return sorted(profiles, key=lambda profile: profile['created'],
+                  reverse=True)
+
+
+def delete_profiles(profiles):
+    for profile in profiles:
+        for extension in ('folded', 'json'):
+            try:
+                os.remove(get_profile_path(profile['id'], extension))
+            except FileNotFoundError:
+                pass
+
+
+def save_profile(sampler, info):
+    """Сохраняет профиль и описание к нему, удаляя самые старые профили."""
+    os.makedirs(settings.PROFILING_ROOT, exist_ok=True)
+
+    profile_id = uuid.uuid4().hex
+    info = dict(info, id=profile_id, created=time.time(),
+                samples=sum(sampler.stacks.values()))
+
+    with open(get_profile_path(profile_id, 'folded'), 'w') as file:
+        file.write(sampler.to_collapsed())
+    # Описание пишется последним: по нему профиль попадает в список
+    with open(get_profile_path(profile_id, 'json'), 'w') as file:
+        json.dump(info, file, ensure_ascii=False)
+
+    delete_profiles(get_profiles()[settings.PROFILING_MAX_PROFILES:])
+
+    return profile_id
+
+
+def get_staff_user(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+        user = result[0] if result is not None else None
+
+    if user is None or not user.is_staff:
+        return None
+
+    return user
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос сотрудника, пришедший с заголовком X-Profile.
+
+    Профиль сохраняется в PROFILING_ROOT, его id возвращается в заголовке
+    X-Profile-Id, скачать профиль можно через /api/v1/profiles/<id>/.
+    Для остальных запросов вся работа сводится к проверке заголовка.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_HEADER not in request.META:
+            return self.get_response(request)
+
+        user = get_staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with Sampler(threading.get_ident(),
+                     settings.PROFILING_INTERVAL) as sampler:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        response[PROFILE_ID_HEADER] = save_profile(sampler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration': round(duration, 6),
+            'interval': settings.PROFILING_INTERVAL,
+            'user': user.pk,
+        })
+
+        return response
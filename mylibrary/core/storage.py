@@ -0,0 +1,87 @@
+import gzip
+import os
+from io import BytesIO
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.txt',
+                         '.html', '.xml', '.ico', '.ttf', '.eot', '.otf')
+COMPRESS_MIN_SIZE = 256
+
+
+def gzip_compress(content):
+    # mtime=0 дает одинаковый результат при повторной сборке
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9,
+                       mtime=0) as file:
+        file.write(content)
+
+    return buffer.getvalue()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени и сжатыми копиями рядом.
+
+    После collectstatic рядом с каждым текстовым файлом лежит .gz и, если
+    установлен пакет brotli, .br. nginx отдает их через gzip_static, не
+    сжимая файлы на каждый запрос. Имена с хешем позволяют кешировать
+    файлы навсегда.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic еще не запускался (тесты, разработка): файла
+            # нет ни в манифесте, ни в STATIC_ROOT
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSED_EXTENSIONS) or not self.exists(name):
+            return
+
+        with self.open(name) as file:
+            content = file.read()
+
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+
+        compressors = [('.gz', gzip_compress)]
+        if brotli is not None:
+            compressors.append(('.br', brotli.compress))
+
+        for extension, compress in compressors:
+            compressed = compress(content)
+            # Сжатая копия, которая не меньше исходного файла, не нужна
+            if len(compressed) >= len(content):
+                continue
+
+            compressed_name = f'{name}{extension}'
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self.save(compressed_name, ContentFile(compressed))
+
+            # nginx строит Last-Modified и ETag по сжатой копии
+            stat = os.stat(self.path(name))
+            os.utime(self.path(compressed_name),
+                     (stat.st_atime, stat.st_mtime))
+
+            yield compressed_name
@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.management.commands.startup_profile import (group_by_app,
+                                                      parse_import_times)
+from core.profiling import PROFILE_ID_HEADER
+from core.tracing import TRACE_ID_HEADER
+from core.warmup import WARM_UP_STEPS, warm_up
+from library.models import Author, Book, Language
+
+
+class WarmUpTests(TestCase):
+    def test_warm_up_runs_all_steps(self):
+        timings = warm_up()
+
+        self.assertEqual(
+            [name for name, seconds in timings],
+            [name for name, step in WARM_UP_STEPS])
+        self.assertTrue(all(seconds >= 0 for name, seconds in timings))
+
+
+class StartupProfileTests(SimpleTestCase):
+    import_time_output = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:       100 |        100 |     rest_framework.fields\n'
+        'import time:        50 |        150 |   rest_framework\n'
+        'import time:       300 |        300 |     '
+        'django.contrib.admin.sites\n'
+        'import time:        20 |        320 |   django.contrib.admin\n'
+        'import time:        10 |         10 | api.views\n'
+    )
+
+    def test_parse_import_times(self):
+        modules = parse_import_times(self.import_time_output)
+
+        self.assertEqual(len(modules), 5)
+        self.assertEqual(modules[0], ('rest_framework.fields', 100, 100))
+
+    def test_group_by_app(self):
+        modules = parse_import_times(self.import_time_output)
+
+        groups = dict(group_by_app(
+            modules, ['django.contrib.admin', 'rest_framework']))
+
+        self.assertEqual(groups['django.contrib.admin'], 320)
+        self.assertEqual(groups['rest_framework'], 150)
+        self.assertEqual(groups['api'], 10)
+
+
+class CompressedStaticFilesTests(SimpleTestCase):
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with tempfile.TemporaryDirectory() as static_root, \
+                override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            staticfiles_storage.load_manifest()
+
+            name = staticfiles_storage.stored_name('admin/css/base.css')
+            with staticfiles_storage.open(name) as file:
+                content = file.read()
+            with staticfiles_storage.open(f'{name}.gz') as file:
+                compressed = file.read()
+
+        self.assertRegex(name, r'^admin/css/base\.[0-9a-f]{12}\.css$')
+        self.assertEqual(gzip.decompress(compressed), content)
+        self.assertLess(len(compressed), len(content))
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        language = Language.objects.create(name='Русский')
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        Book.objects.bulk_create(
+            Book(name=f'Книга {number}', author=author, language=language,
+                 publication_year=1900 + number)
+            for number in range(3))
+        self.user = get_user_model().objects.create_user('reader')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traces.jsonl')
+
+    def get_books(self, sample_rate):
+        with override_settings(TRACING_SAMPLE_RATE=sample_rate,
+                               TRACING_EXPORTER='file',
+                               TRACING_FILE=self.path):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            return client.get('/api/v1/books/')
+
+    def test_sampled_request_is_exported(self):
+        response = self.get_books(1)
+
+        with open(self.path) as file:
+            traces = [json.loads(line) for line in file]
+
+        self.assertEqual(len(traces), 1)
+        spans = traces[0]['resourceSpans'][0]['scopeSpans'][0]['spans']
+        names = [span['name'] for span in spans]
+        self.assertEqual(names[-1], 'GET /api/v1/books/')
+        self.assertIn('db.query', names)
+        self.assertIn('permissions', names)
+        # Список сериализуется одним спаном
+        self.assertEqual(names.count('serialize'), 1)
+        self.assertEqual(
+            {span['traceId'] for span in spans},
+            {response[TRACE_ID_HEADER]})
+
+        root = spans[-1]
+        self.assertEqual(root['parentSpanId'], '')
+        self.assertTrue(all(span['parentSpanId'] for span in spans[:-1]))
+
+    def test_unsampled_request_has_trace_id(self):
+        response = self.get_books(0)
+
+        self.assertRegex(response[TRACE_ID_HEADER], r'^[0-9a-f]{32}$')
+        self.assertFalse(os.path.exists(self.path))
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = override_settings(PROFILING_ROOT=directory.name)
+        root.enable()
+        self.addCleanup(root.disable)
+
+    def get_client(self, is_staff):
+        user = get_user_model().objects.create_user(
+            f'user{is_staff}', is_staff=is_staff)
+        client = APIClient()
+        token = AccessToken.for_user(user)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_staff_request_is_profiled(self):
+        client = self.get_client(is_staff=True)
+
+        response = client.get('/api/v1/books/', HTTP_X_PROFILE='1')
+        profile_id = response[PROFILE_ID_HEADER]
+
+        profiles = client.get('/api/v1/profiles/').json()
+        self.assertEqual([profile['id'] for profile in profiles],
+                         [profile_id])
+        self.assertEqual(profiles[0]['path'], '/api/v1/books/')
+
+        response = client.get(f'/api/v1/profiles/{profile_id}/')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        for line in content.splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_other_requests_are_not_profiled(self):
+        client = self.get_client(is_staff=False)
+
+        response = client.get('/api/v1/books/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+        self.assertEqual(client.get('/api/v1/profiles/').status_code, 403)
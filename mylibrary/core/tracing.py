@@ -0,0 +1,277 @@
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+import httpx
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = 'X-Trace-Id'
+TRACEPARENT = re.compile(r'^00-(?P<trace_id>[0-9a-f]{32})-[0-9a-f]{16}-')
+MAX_STATEMENT_LENGTH = 1000
+
+# Виды спанов OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_CODE_ERROR = 2
+
+_current_span = contextvars.ContextVar('tracing_span', default=None)
+
+
+def generate_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    def __init__(self, trace, name, kind=SPAN_KIND_INTERNAL, parent=None,
+                 attributes=None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = generate_id(64)
+        self.parent_id = parent.span_id if parent is not None else ''
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_time = self.end_time = None
+        self.token = None
+
+    def __enter__(self):
+        self.start_time = time.time_ns()
+        self.token = _current_span.set(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end_time = time.time_ns()
+        _current_span.reset(self.token)
+
+        if exc_value is not None:
+            self.error = f'{exc_type.__name__}: {exc_value}'
+        self.trace.spans.append(self)
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_time),
+            'endTimeUnixNano': str(self.end_time),
+            'attributes': [
+                {'key': key, 'value': to_otlp_value(value)}
+                for key, value in self.attributes.items()],
+        }
+        if self.error is not None:
+            span['status'] = {'code': STATUS_CODE_ERROR,
+                              'message': self.error}
+
+        return span
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or generate_id(128)
+        self.spans = []
+
+    def to_otlp(self):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name',
+                'value': {'stringValue': settings.TRACING_SERVICE_NAME},
+            }]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in self.spans],
+            }],
+        }]}
+
+
+def to_otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+
+    return {'stringValue': str(value)}
+
+
+class NoopSpan:
+    attributes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def get_current_span():
+    return _current_span.get()
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """Контекстный менеджер спана внутри текущей трассировки.
+
+    Вне трассируемого запроса возвращает пустой спан, поэтому вызов почти
+    ничего не стоит, когда запрос не попал в выборку.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+
+    return Span(parent.trace, name, kind, parent, attributes)
+
+
+def trace_query(execute, sql, params, many, context):
+    with span('db.query', SPAN_KIND_CLIENT, **{
+            'db.system': 'postgresql',
+            'db.statement': sql[:MAX_STATEMENT_LENGTH],
+            'db.executemany': many}):
+        return execute(sql, params, many, context)
+
+
+class FileExporter:
+    """Дописывает трассировки в файл, по одному OTLP JSON в строке."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace.to_otlp(), ensure_ascii=False)
+
+        with self.lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+
+class OtlpHttpExporter:
+    """Отправляет трассировки в коллектор по OTLP/HTTP JSON.
+
+    Отправка идет из фонового потока пачками, запрос пользователя ее не
+    ждет. Если коллектор не успевает, лишние трассировки отбрасываются.
+    """
+    batch_size = 100
+    queue_size = 1000
+    flush_interval = 1
+
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.queue = queue.Queue(self.queue_size)
+        self.thread = None
+
+    def export(self, trace):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name='tracing-exporter', daemon=True)
+            self.thread.start()
+
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def run(self):
+        with httpx.Client(timeout=self.timeout) as client:
+            while True:
+                traces = [self.queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(traces) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        traces.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                self.send(client, traces)
+
+    def send(self, client, traces):
+        body = {'resourceSpans': [
+            resource_spans for trace in traces
+            for resource_spans in trace.to_otlp()['resourceSpans']]}
+
+        try:
+            client.post(self.endpoint, json=body).raise_for_status()
+        except httpx.HTTPError:
+            logger.warning('Не удалось отправить трассировки в %s',
+                           self.endpoint, exc_info=True)
+
+
+def get_exporter():
+    if settings.TRACING_EXPORTER == 'file':
+        return FileExporter(settings.TRACING_FILE)
+    if settings.TRACING_EXPORTER == 'otlp':
+        return OtlpHttpExporter(settings.TRACING_OTLP_ENDPOINT)
+
+    return None
+
+
+class TracingMiddleware:
+    """Выдает каждому запросу trace ID и трассирует часть запросов.
+
+    Доля трассируемых запросов задается TRACING_SAMPLE_RATE. Для них
+    записываются спаны запросов к БД и спаны из span(), а по завершении
+    запроса трассировка передается экспортеру.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.exporter = get_exporter()
+
+    def get_trace_id(self, request):
+        match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+
+        return match.group('trace_id') if match else None
+
+    def __call__(self, request):
+        trace = Trace(self.get_trace_id(request))
+        sampled = (self.exporter is not None
+                   and random.random() < settings.TRACING_SAMPLE_RATE)
+
+        if not sampled:
+            response = self.get_response(request)
+            response[TRACE_ID_HEADER] = trace.trace_id
+            return response
+
+        root = Span(trace, f'{request.method} {request.path}',
+                    SPAN_KIND_SERVER, attributes={
+                        'http.method': request.method,
+                        'http.target': request.get_full_path()})
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(trace_query))
+            with root:
+                response = self.get_response(request)
+
+        root.attributes['http.status_code'] = response.status_code
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            root.attributes['http.route'] = resolver_match.route
+
+        try:
+            self.exporter.export(trace)
+        except Exception:
+            logger.exception('Не удалось экспортировать трассировку')
+
+        response[TRACE_ID_HEADER] = trace.trace_id
+
+        return response
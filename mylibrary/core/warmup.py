@@ -0,0 +1,90 @@
+import time
+
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import URLResolver, get_resolver
+
+
+def _walk_patterns(patterns):
+    for pattern in patterns:
+        # Регулярные выражения компилируются лениво при первом обращении
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _walk_patterns(pattern.url_patterns)
+
+
+def warm_up_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict
+    _walk_patterns(resolver.url_patterns)
+
+
+def warm_up_rest_framework():
+    from rest_framework.settings import api_settings
+    from rest_framework_simplejwt.settings import \
+        api_settings as jwt_settings
+
+    for name in ('DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_RENDERER_CLASSES',
+                 'DEFAULT_PARSER_CLASSES', 'DEFAULT_FILTER_BACKENDS',
+                 'DEFAULT_CONTENT_NEGOTIATION_CLASS'):
+        getattr(api_settings, name)
+
+    jwt_settings.AUTH_TOKEN_CLASSES
+    jwt_settings.USER_ID_FIELD
+
+
+def warm_up_serializers():
+    from api.urls import router
+
+    for prefix, viewset, basename in router.registry:
+        serializer_class = getattr(viewset, 'serializer_class', None)
+        if serializer_class is None:
+            continue
+
+        serializer_class().fields
+
+
+def warm_up_schema():
+    from rest_framework.request import Request
+
+    from mylibrary.urls import api_info, schema_view
+
+    # Анонимный запрос нужен полям вроде CurrentUserDefault
+    request = HttpRequest()
+    request.method = 'GET'
+
+    generator = schema_view.generator_class(api_info, url='http://localhost')
+    generator.get_schema(request=Request(request), public=True)
+
+
+def warm_up_database():
+    # Соединения Django у каждого потока свои: открытое здесь соединение
+    # получит только sync-воркер, где запросы выполняются в этом же потоке.
+    # Потоки gthread все равно откроют свои при первом запросе
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+WARM_UP_STEPS = (
+    ('urls', warm_up_urls),
+    ('rest_framework', warm_up_rest_framework),
+    ('serializers', warm_up_serializers),
+    ('schema', warm_up_schema),
+    ('database', warm_up_database),
+)
+
+
+def warm_up(steps=WARM_UP_STEPS):
+    """Прогревает ленивые пути, которые иначе выполнятся в первом запросе.
+
+    Возвращает список пар (шаг, длительность в секундах).
+    """
+    timings = []
+
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings.append((name, time.perf_counter() - started))
+
+    return timings
@@ -1,8 +1,71 @@
 from django.contrib import admin
 
+from core.paginator import EstimatedCountPaginator
+
+from .deletion import hide_author
 from .models import Author, Book, Follow, Language
 
-admin.site.register(Author)
-admin.site.register(Book)
-admin.site.register(Language)
-admin.site.register(Follow)
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PublicationCenturyListFilter(admin.SimpleListFilter):
+    title = 'Век публикации'
+    parameter_name = 'century'
+
+    def lookups(self, request, model_admin):
+        return [(str(century), f'{century} век')
+                for century in range(21, 14, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+
+        century = int(self.value())
+
+        return queryset.filter(
+            publication_year__gt=(century - 1) * 100,
+            publication_year__lte=century * 100)
+
+
+@admin.register(Author)
+class AuthorAdmin(LargeTableAdmin):
+    list_display = ('last_name', 'first_name', 'middle_name', 'created')
+    search_fields = ('^last_name', '^first_name')
+    # Список и автодополнение в BookAdmin идут в алфавитном порядке, id
+    # делает порядок однозначным для постраничного вывода
+    ordering = ('last_name', 'first_name', 'id')
+
+    # Удаление только скрывает автора, строки удаляет purge_hidden_authors
+    def delete_model(self, request, obj):
+        hide_author(obj)
+
+    def delete_queryset(self, request, queryset):
+        for author in queryset:
+            hide_author(author)
+
+
+@admin.register(Language)
+class LanguageAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+@admin.register(Book)
+class BookAdmin(LargeTableAdmin):
+    list_display = ('name', 'author', 'language', 'publication_year',
+                    'created')
+    list_select_related = ('author', 'language')
+    list_filter = ('language', PublicationCenturyListFilter)
+    search_fields = ('^name',)
+    autocomplete_fields = ('author', 'language')
+
+
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('user', 'author', 'created')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
@@ -0,0 +1,182 @@
+import copy
+import json
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+
+from library.models import Author, Language
+
+REFERENCE_CHANNEL = 'library_reference_changed'
+MAX_PENDING_NOTIFIES = 1000
+
+
+class ReferenceCache:
+    """Кеш строк справочной таблицы в памяти процесса.
+
+    С preload=True при первом промахе загружается вся таблица, и отсутствие
+    id в кеше означает отсутствие строки. Иначе кеш хранит не больше
+    последних прочитанных строк (LRU), чем задает настройка size_setting.
+
+    Перед каждым чтением принимаются уведомления об изменениях (см.
+    receive_notifications), поэтому изменения из других процессов видны
+    сразу после их коммита. Строка, прочитанная из БД во время
+    инвалидации, в кеш не попадает: это отслеживает счетчик generation.
+    """
+
+    def __init__(self, model, size_setting=None, preload=False,
+                 using='default'):
+        self.model = model
+        self.size_setting = size_setting
+        self.preload = preload
+        self.using = using
+        self.items = OrderedDict()
+        self.complete = False
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def invalidate(self, pk=None):
+        with self.lock:
+            self.generation += 1
+            self.complete = False
+            if pk is None:
+                self.items.clear()
+            else:
+                self.items.pop(pk, None)
+
+    def get_queryset(self):
+        return self.model._default_manager.using(self.using)
+
+    def get_many(self, ids):
+        """Возвращает {id: копия объекта} для найденных id."""
+        if not settings.REFERENCE_CACHE_ENABLED:
+            return self.get_queryset().in_bulk(ids)
+
+        receive_notifications(self.using)
+
+        found = {}
+        with self.lock:
+            generation = self.generation
+            complete = self.complete
+            for pk in ids:
+                item = self.items.get(pk)
+                if item is not None:
+                    found[pk] = item
+                    self.items.move_to_end(pk)
+
+        missing = set(ids) - found.keys()
+        if missing and not complete:
+            if self.preload:
+                loaded = self.get_queryset().in_bulk()
+            else:
+                loaded = self.get_queryset().in_bulk(missing)
+            # Внутри транзакции видны и незакоммиченные строки, после
+            # отката они остались бы в кеше
+            if not connections[self.using].in_atomic_block:
+                self.store(loaded, generation)
+            found.update((pk, loaded[pk]) for pk in missing if pk in loaded)
+
+        return {pk: copy.copy(item) for pk, item in found.items()}
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def store(self, loaded, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.items.update(loaded)
+            if self.preload:
+                self.complete = True
+                return
+
+            # Размер читается при записи, а не при импорте модуля
+            max_size = getattr(settings, self.size_setting)
+            if len(self.items) > max_size:
+                for _ in range(len(self.items) - max_size):
+                    self.items.popitem(last=False)
+
+
+language_cache = ReferenceCache(Language, preload=True)
+author_cache = ReferenceCache(Author, size_setting='AUTHOR_CACHE_SIZE')
+
+REFERENCE_CACHES = {
+    'language': language_cache,
+    'author': author_cache,
+}
+
+
+def get_reference_cache(model):
+    for cache in REFERENCE_CACHES.values():
+        if cache.model is model:
+            return cache
+
+    return None
+
+
+def invalidate_all():
+    for cache in REFERENCE_CACHES.values():
+        cache.invalidate()
+
+
+def receive_notifications(using='default'):
+    """Применяет уведомления, пришедшие на соединение текущего потока.
+
+    Каждое соединение процесса слушает REFERENCE_CHANNEL с момента
+    открытия, поэтому уведомление о коммите в любом процессе лежит в его
+    сокете. poll() забирает их без запроса к серверу. Внутри транзакции
+    сервер придерживает уведомления до ее конца, свои изменения процесс
+    видит через сигналы моделей.
+    """
+    connection = connections[using]
+    # Новое соединение при открытии само очищает кеши
+    connection.ensure_connection()
+
+    connection.connection.poll()
+    notifies = connection.connection.notifies
+    if len(notifies) == notifies.maxlen:
+        # Часть уведомлений могла вытесниться
+        invalidate_all()
+        notifies.clear()
+
+    while notifies:
+        notify = notifies.popleft()
+        if notify.channel != REFERENCE_CHANNEL:
+            continue
+
+        event = json.loads(notify.payload)
+        cache = REFERENCE_CACHES.get(event['model'])
+        if cache is not None:
+            cache.invalidate(event['id'])
+
+
+def listen(sender, connection, **kwargs):
+    if connection.vendor != 'postgresql':
+        return
+
+    # Соединения, которые не читают кеш (команды, потоки рассылки), не
+    # разбирают уведомления, поэтому их очередь ограничена
+    connection.connection.notifies = deque(maxlen=MAX_PENDING_NOTIFIES)
+    with connection.cursor() as cursor:
+        cursor.execute(f'LISTEN {REFERENCE_CHANNEL}')
+
+    # Пока соединения не было, уведомления могли не дойти. Поэтому каждое
+    # переподключение, в том числе по истечении CONN_MAX_AGE, стоит
+    # процессу его кешей
+    invalidate_all()
+
+
+def invalidate_instance(sender, instance, **kwargs):
+    cache = get_reference_cache(sender)
+    if cache is not None:
+        cache.invalidate(instance.pk)
+
+
+connection_created.connect(listen)
+for model in (Language, Author):
+    post_save.connect(invalidate_instance, sender=model)
+    post_delete.connect(invalidate_instance, sender=model)
@@ -0,0 +1,123 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from library.models import Book
+
+logger = logging.getLogger(__name__)
+
+COVER_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+THUMBNAIL_SIZE = (320, 480)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BOOK_COVER_THUMBNAIL_WORKERS,
+            thread_name_prefix='cover-thumbnail')
+
+    return _executor
+
+
+def get_cover_format(file):
+    """Возвращает формат изображения или None, если формат не подходит."""
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        return None
+    finally:
+        file.seek(0)
+
+    if image_format not in COVER_FORMATS:
+        return None
+
+    return image_format
+
+
+def get_cover_name(book_id, extension, prefix=''):
+    return f'covers/{book_id}/{prefix}{uuid.uuid4().hex}.{extension}'
+
+
+def delete_files(names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def generate_thumbnail(book_id):
+    book = Book.objects.filter(pk=book_id).only(
+        'publication_year', 'cover', 'cover_thumbnail').first()
+    if book is None or not book.cover:
+        return None
+
+    with book.cover.open('rb') as file, Image.open(file) as image:
+        thumbnail = ImageOps.exif_transpose(image)
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        if thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+
+        content = BytesIO()
+        thumbnail.save(content, 'JPEG', quality=85, optimize=True)
+
+    name = default_storage.save(
+        get_cover_name(book_id, 'jpg', prefix='thumbnail-'),
+        ContentFile(content.getvalue()))
+
+    # Обложку могли заменить, пока строилась миниатюра
+    updated = Book.objects.filter(
+        pk=book_id, publication_year=book.publication_year,
+        cover=book.cover.name).update(cover_thumbnail=name)
+    if not updated:
+        delete_files([name])
+        return None
+
+    delete_files([book.cover_thumbnail.name])
+
+    return name
+
+
+def generate_thumbnail_in_thread(book_id):
+    try:
+        generate_thumbnail(book_id)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру книги %s', book_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnail(book_id):
+    get_executor().submit(generate_thumbnail_in_thread, book_id)
+
+
+def generate_missing_thumbnails():
+    """Строит миниатюры книг, у которых есть обложка, но нет миниатюры.
+
+    Задания пула теряются при перезапуске воркера, их подбирает этот
+    проход. Возвращает число построенных миниатюр.
+    """
+    book_ids = Book.objects.exclude(cover='').filter(
+        cover_thumbnail='').order_by('id').values_list('id', flat=True)
+
+    generated = 0
+    for book_id in book_ids.iterator():
+        try:
+            if generate_thumbnail(book_id) is not None:
+                generated += 1
+        except Exception:
+            logger.exception('Не удалось построить миниатюру книги %s',
+                             book_id)
+
+    return generated
@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from library.covers import delete_files
+from library.models import Author, Book, Follow
+
+
+def hide_author(author):
+    """Скрывает автора вместо удаления.
+
+    Автор сразу пропадает из API вместе с книгами и подписками, а строки
+    удаляет команда purge_hidden_authors.
+    """
+    author.is_hidden = True
+    author.save(update_fields=['is_hidden'])
+
+
+def delete_follows_batch(author_id, batch_size):
+    table = Follow._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'    SELECT id FROM {table} WHERE author_id = %s LIMIT %s)',
+            [author_id, batch_size])
+        return cursor.rowcount
+
+
+def delete_books_batch(author_id, batch_size):
+    table = Book._meta.db_table
+
+    # Первичный ключ секционированной таблицы - (id, publication_year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE (id, publication_year) IN ('
+            f'    SELECT id, publication_year FROM {table} '
+            f'    WHERE author_id = %s LIMIT %s) '
+            f'RETURNING cover, cover_thumbnail',
+            [author_id, batch_size])
+        files = cursor.fetchall()
+
+        # Файлы обложек удаляются только после коммита
+        names = [name for row in files for name in row]
+        transaction.on_commit(partial(delete_files, names))
+
+    return len(files)
+
+
+def purge_author(author_id, batch_size=None):
+    """Удаляет скрытого автора, его подписки и книги пачками.
+
+    Каждая пачка - отдельная короткая транзакция, поэтому блокировки не
+    держатся долго, а прерванное удаление продолжится со следующего
+    запуска. Оставшееся (статистика, рассылки) удаляется каскадом в БД
+    вместе со строкой автора. Возвращает число удаленных книг и подписок.
+    """
+    batch_size = batch_size or settings.AUTHOR_PURGE_BATCH_SIZE
+    deleted = {'follows': 0, 'books': 0}
+
+    for name, delete in (('follows', delete_follows_batch),
+                         ('books', delete_books_batch)):
+        while True:
+            count = delete(author_id, batch_size)
+            deleted[name] += count
+            if count < batch_size:
+                break
+
+    Author.all_objects.filter(pk=author_id, is_hidden=True).delete()
+
+    return deleted
+
+
+def purge_hidden_authors(batch_size=None):
+    author_ids = Author.all_objects.hidden().order_by('id').values_list(
+        'id', flat=True)
+
+    return {author_id: purge_author(author_id, batch_size)
+            for author_id in author_ids}
@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.email import send_email_using_bcc
+from library.models import FanoutJob, FanoutPartition, Follow
+
+# Первый ключ рекомендательных блокировок pg_try_advisory_lock(int, int)
+FANOUT_LOCK_NAMESPACE = 37
+
+
+class FanoutError(Exception):
+    pass
+
+
+def get_followers(job):
+    return Follow.objects.filter(author_id=job.author_id).order_by('id')
+
+
+def plan_partitions(job, partition_size=None):
+    """Делит подписчиков рассылки на диапазоны Follow.id.
+
+    Выполняется один раз: повторный вызов вернет уже созданные диапазоны.
+    """
+    partition_size = partition_size or settings.FANOUT_PARTITION_SIZE
+
+    with transaction.atomic():
+        job = FanoutJob.objects.select_for_update().get(pk=job.pk)
+        if job.is_planned:
+            return list(job.partitions.order_by('start_id'))
+
+        bounds = []
+        follow_ids = get_followers(job).values_list('id', flat=True)
+        for number, follow_id in enumerate(follow_ids.iterator()):
+            if number % partition_size == 0:
+                bounds.append([follow_id, follow_id])
+            bounds[-1][1] = follow_id
+
+        partitions = FanoutPartition.objects.bulk_create(
+            FanoutPartition(job=job, start_id=start_id, end_id=end_id,
+                            last_id=start_id - 1)
+            for start_id, end_id in bounds)
+
+        job.is_planned = True
+        job.save(update_fields=['is_planned'])
+
+    return partitions
+
+
+def send_batch(partition, recipients, last_id):
+    # Ошибка SMTP прерывает диапазон до сохранения last_id, поэтому
+    # следующий запуск отправит это письмо снова
+    sent = send_email_using_bcc(
+        subject=partition.job.subject, message=partition.job.message,
+        recipient_list=recipients, from_email=settings.DEFAULT_FROM_EMAIL,
+        fail_silently=False)
+    if not sent:
+        raise FanoutError(
+            f'Рассылка {partition.job_id}: письмо не отправлено, проверьте '
+            f'DEFAULT_FROM_EMAIL, тему и текст')
+
+    partition.last_id = last_id
+    partition.sent_count += len(recipients)
+    partition.save(update_fields=['last_id', 'sent_count'])
+
+
+def process_partition(partition_id, batch_size=None):
+    """Рассылает письма подписчикам одного диапазона.
+
+    Адреса читаются серверным курсором, после каждого письма в last_id
+    сохраняется последняя обработанная подписка, поэтому после сбоя
+    обработка продолжится с места остановки. Повторно может уйти только
+    письмо, отправленное перед самым сбоем. Диапазон, который уже
+    обрабатывает другой поток или процесс, пропускается.
+    Возвращает число адресатов.
+    """
+    batch_size = batch_size or settings.FANOUT_BATCH_SIZE
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)',
+                       [FANOUT_LOCK_NAMESPACE, partition_id])
+        if not cursor.fetchone()[0]:
+            return 0
+
+    try:
+        partition = FanoutPartition.objects.select_related('job').get(
+            pk=partition_id)
+        if partition.finished_at is not None:
+            return 0
+
+        sent_count = partition.sent_count
+        followers = get_followers(partition.job).filter(
+            id__gt=partition.last_id, id__lte=partition.end_id).exclude(
+            user__email='').values_list('id', 'user__email')
+
+        recipients = []
+        for follow_id, email in followers.iterator(chunk_size=batch_size):
+            recipients.append(email)
+            if len(recipients) == batch_size:
+                send_batch(partition, recipients, follow_id)
+                recipients = []
+
+        if recipients:
+            send_batch(partition, recipients, follow_id)
+
+        partition.finished_at = timezone.now()
+        partition.save(update_fields=['finished_at'])
+
+        return partition.sent_count - sent_count
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)',
+                           [FANOUT_LOCK_NAMESPACE, partition_id])
+
+
+def process_partition_in_thread(partition_id):
+    try:
+        return process_partition(partition_id)
+    finally:
+        connection.close()
+
+
+def run_fanout_job(job, workers=None):
+    """Выполняет рассылку, обрабатывая диапазоны в пуле потоков.
+
+    С одним потоком или одним диапазоном работает в текущем потоке.
+    Возвращает число адресатов, которым ушли письма за этот запуск.
+    """
+    workers = workers or settings.FANOUT_WORKERS
+    pending = [partition.pk for partition in plan_partitions(job)
+               if partition.finished_at is None]
+
+    if workers == 1 or len(pending) <= 1:
+        sent_count = sum(map(process_partition, pending))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            sent_count = sum(executor.map(
+                process_partition_in_thread, pending))
+
+    if not job.partitions.filter(finished_at__isnull=True).exists():
+        job.finished_at = timezone.now()
+        job.save(update_fields=['finished_at'])
+
+    return sent_count
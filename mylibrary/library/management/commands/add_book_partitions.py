@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from library.partitioning import BOOK_PARTITIONS_AHEAD, add_year_partition
+
+
+class Command(BaseCommand):
+    help = ('Добавляет годовые секции таблицы книг на текущий и следующие '
+            'годы, перенося в них строки из секции по умолчанию')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years', type=int, default=BOOK_PARTITIONS_AHEAD,
+            help='На сколько лет вперед нужны секции')
+
+    def handle(self, *args, **options):
+        current_year = datetime.now().year
+
+        for year in range(current_year, current_year + options['years'] + 1):
+            with transaction.atomic(), connection.cursor() as cursor:
+                moved = add_year_partition(cursor, year)
+
+            if moved is None:
+                continue
+
+            self.stdout.write(
+                f'{year}: секция создана, перенесено строк: {moved}')
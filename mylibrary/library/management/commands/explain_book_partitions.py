@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from library.models import Book
+from library.partitioning import explain, get_scanned_relations
+
+
+class Command(BaseCommand):
+    help = ('Показывает, какие секции таблицы книг читают запросы списка '
+            'книг и поиска, и время их выполнения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Выполнить запросы (EXPLAIN ANALYZE)')
+        parser.add_argument(
+            '--search', default='мир',
+            help='Строка полнотекстового поиска по названию, как в API')
+
+    def get_querysets(self, search):
+        visible = Book.objects.filter(
+            publication_year__lte=datetime.now().year)
+
+        return (
+            ('visible', visible.order_by('-publication_year', '-id')[:20]),
+            ('visible_search', visible.filter(
+                name__search=search).order_by('-id')[:20]),
+            ('search', Book.objects.filter(
+                name__search=search).order_by('-id')[:20]),
+            ('decade', Book.objects.filter(
+                publication_year__gte=1950,
+                publication_year__lt=1960).order_by('-id')[:20]),
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM pg_inherits '
+                'WHERE inhparent = %s::regclass', [Book._meta.db_table])
+            total = cursor.fetchone()[0]
+
+        for name, queryset in self.get_querysets(options['search']):
+            result = explain(queryset, options['analyze'])
+            scanned = sorted(get_scanned_relations(result['Plan']))
+
+            line = f'{name}: секций {len(scanned)} из {total}'
+            if options['analyze']:
+                line += f', {result["Execution Time"]:.2f} мс'
+            self.stdout.write(line)
+            self.stdout.write(f'    {", ".join(scanned)}')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.covers import generate_missing_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры обложек, которые не построил фоновый пул'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, проверяя книги без миниатюр')
+        parser.add_argument(
+            '--interval', type=float, default=600,
+            help='Пауза между проверками, с')
+
+    def handle(self, *args, **options):
+        while True:
+            generated = generate_missing_thumbnails()
+
+            if generated:
+                self.stdout.write(f'Построено миниатюр: {generated}')
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
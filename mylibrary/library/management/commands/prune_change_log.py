@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library.models import Change
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из журнала изменений записи старше срока хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHANGE_LOG_RETENTION_DAYS,
+            help='Срок хранения записей, дней')
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.CHANGE_LOG_PRUNE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        created_before = timezone.now() - timedelta(days=options['days'])
+        deleted = Change.objects.prune(created_before, options['batch_size'])
+
+        self.stdout.write(f'Удалено записей журнала: {deleted}')
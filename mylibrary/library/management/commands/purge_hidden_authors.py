@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.deletion import purge_hidden_authors
+
+
+class Command(BaseCommand):
+    help = ('Удаляет скрытых авторов вместе с их книгами и подписками '
+            'короткими пачками')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, проверяя скрытых авторов')
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='Пауза между проверками, с')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_hidden_authors(options['batch_size'])
+
+            for author_id, deleted in purged.items():
+                self.stdout.write(
+                    f'Автор {author_id} удален: книг {deleted["books"]}, '
+                    f'подписок {deleted["follows"]}')
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from library.models import AuthorYearStat, Book, LanguageYearStat
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводную статистику по книгам с нуля. Обычно ее '
+            'ведут триггеры, команда нужна для сверки и восстановления')
+
+    def handle(self, *args, **options):
+        book_table = Book._meta.db_table
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Блокируем запись в книги, чтобы триггеры не разошлись
+            # с пересчетом
+            cursor.execute(f'LOCK TABLE {book_table} IN SHARE MODE')
+
+            for model, column in ((LanguageYearStat, 'language_id'),
+                                  (AuthorYearStat, 'author_id')):
+                table = model._meta.db_table
+                cursor.execute(f'DELETE FROM {table}')
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    f'({column}, publication_year, books_count) '
+                    f'SELECT {column}, publication_year, COUNT(*) '
+                    f'FROM {book_table} GROUP BY {column}, publication_year')
+                self.stdout.write(f'{table}: {cursor.rowcount}')
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.similarity import rebuild_similar_authors, refresh_pending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожих авторов для авторов, у которых изменились '
+            'подписчики')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать всех авторов, а не только очередь')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, разбирая очередь')
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='Пауза, когда очередь пуста, с')
+        parser.add_argument(
+            '--rebuild-interval', type=float,
+            help='С --loop пересчитывать всех авторов раз в столько секунд')
+        parser.add_argument('--batch-size', type=int)
+
+    def rebuild(self, batch_size):
+        refreshed = rebuild_similar_authors(batch_size)
+        self.stdout.write(f'Пересчитано авторов: {refreshed}')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            self.rebuild(options['batch_size'])
+            return
+
+        rebuilt_at = time.monotonic()
+        while True:
+            # Очередь не ловит авторов, которые поднялись в чужой список
+            # похожих, когда у них стало меньше подписчиков
+            if (options['rebuild_interval'] and time.monotonic()
+                    - rebuilt_at >= options['rebuild_interval']):
+                self.rebuild(options['batch_size'])
+                rebuilt_at = time.monotonic()
+
+            refreshed = refresh_pending(options['batch_size'])
+            if refreshed:
+                self.stdout.write(f'Пересчитано авторов: {refreshed}')
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
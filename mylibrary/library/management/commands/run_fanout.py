@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.fanout import run_fanout_job
+from library.models import FanoutJob
+
+
+class Command(BaseCommand):
+    help = ('Выполняет незавершенные рассылки о новых книгах, обрабатывая '
+            'диапазоны подписчиков параллельно')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, опрашивая очередь рассылок')
+        parser.add_argument(
+            '--interval', type=float, default=10,
+            help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--workers', type=int)
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = FanoutJob.objects.filter(
+                finished_at__isnull=True).order_by('id')
+
+            for job in jobs:
+                try:
+                    sent_count = run_fanout_job(
+                        job, workers=options['workers'])
+                except Exception as error:
+                    # Диапазоны остаются незавершенными до следующего прохода
+                    self.stderr.write(f'Рассылка {job.pk} прервана: {error}')
+                    continue
+
+                if sent_count:
+                    self.stdout.write(
+                        f'Рассылка {job.pk}: отправлено адресатам: '
+                        f'{sent_count}')
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
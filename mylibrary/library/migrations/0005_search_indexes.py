@@ -0,0 +1,32 @@
+# Generated by Django 3.2.8 on 2026-10-19 11:55
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_auto_20211129_2325'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='publication_year',
+            field=models.PositiveSmallIntegerField(db_index=True, verbose_name='Год публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='text_pattern_ops'), name='author_last_name_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='text_pattern_ops'), name='author_first_name_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='book_name_prefix'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+STATS_TRIGGER_SQL = '''
+CREATE FUNCTION library_book_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE library_languageyearstat SET books_count = books_count - 1
+        WHERE language_id = OLD.language_id
+            AND publication_year = OLD.publication_year;
+        UPDATE library_authoryearstat SET books_count = books_count - 1
+        WHERE author_id = OLD.author_id
+            AND publication_year = OLD.publication_year;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO library_languageyearstat
+            (language_id, publication_year, books_count)
+        VALUES (NEW.language_id, NEW.publication_year, 1)
+        ON CONFLICT (language_id, publication_year) DO UPDATE
+        SET books_count = library_languageyearstat.books_count + 1;
+        INSERT INTO library_authoryearstat
+            (author_id, publication_year, books_count)
+        VALUES (NEW.author_id, NEW.publication_year, 1)
+        ON CONFLICT (author_id, publication_year) DO UPDATE
+        SET books_count = library_authoryearstat.books_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER library_book_stats_insert_delete
+AFTER INSERT OR DELETE ON library_book
+FOR EACH ROW EXECUTE FUNCTION library_book_stats();
+
+CREATE TRIGGER library_book_stats_update
+AFTER UPDATE OF author_id, language_id, publication_year ON library_book
+FOR EACH ROW
+WHEN (OLD.author_id IS DISTINCT FROM NEW.author_id
+    OR OLD.language_id IS DISTINCT FROM NEW.language_id
+    OR OLD.publication_year IS DISTINCT FROM NEW.publication_year)
+EXECUTE FUNCTION library_book_stats();
+
+INSERT INTO library_languageyearstat
+    (language_id, publication_year, books_count)
+SELECT language_id, publication_year, COUNT(*)
+FROM library_book GROUP BY language_id, publication_year;
+
+INSERT INTO library_authoryearstat (author_id, publication_year, books_count)
+SELECT author_id, publication_year, COUNT(*)
+FROM library_book GROUP BY author_id, publication_year;
+'''
+
+DROP_STATS_TRIGGER_SQL = '''
+DROP TRIGGER library_book_stats_update ON library_book;
+DROP TRIGGER library_book_stats_insert_delete ON library_book;
+DROP FUNCTION library_book_stats();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LanguageYearStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('publication_year', models.PositiveSmallIntegerField(verbose_name='Год публикации')),
+                ('books_count', models.IntegerField(default=0, verbose_name='Количество книг')),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_stats', to='library.language', verbose_name='Язык')),
+            ],
+            options={
+                'unique_together': {('language', 'publication_year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthorYearStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('publication_year', models.PositiveSmallIntegerField(verbose_name='Год публикации')),
+                ('books_count', models.IntegerField(default=0, verbose_name='Количество книг')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_stats', to='library.author', verbose_name='Автор')),
+            ],
+            options={
+                'unique_together': {('author', 'publication_year')},
+            },
+        ),
+        migrations.RunSQL(STATS_TRIGGER_SQL, DROP_STATS_TRIGGER_SQL),
+    ]
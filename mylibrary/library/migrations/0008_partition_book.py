@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from library.partitioning import partition_book_table, unpartition_book_table
+
+
+def partition_book(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        partition_book_table(cursor)
+
+
+def unpartition_book(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        unpartition_book_table(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_book_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_book, unpartition_book),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+CHANGE_TRIGGERS_SQL = '''
+CREATE FUNCTION library_change_log() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO library_change (txid, model, object_id, action, created)
+        VALUES (txid_current(), TG_ARGV[0], OLD.id, 'delete', NOW());
+    ELSE
+        INSERT INTO library_change (txid, model, object_id, action, created)
+        VALUES (txid_current(), TG_ARGV[0], NEW.id,
+            CASE TG_OP WHEN 'INSERT' THEN 'create' ELSE 'update' END, NOW());
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+DROP_CHANGE_TRIGGERS_SQL = '''
+DROP FUNCTION library_change_log();
+'''
+
+CHANGE_TABLES = (
+    ('language', 'library_language'),
+    ('author', 'library_author'),
+    ('book', 'library_book'),
+)
+
+for model, table in CHANGE_TABLES:
+    CHANGE_TRIGGERS_SQL += f'''
+CREATE TRIGGER {table}_change_insert_delete
+AFTER INSERT OR DELETE ON {table}
+FOR EACH ROW EXECUTE FUNCTION library_change_log('{model}');
+
+CREATE TRIGGER {table}_change_update
+AFTER UPDATE ON {table}
+FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION library_change_log('{model}');
+
+INSERT INTO library_change (txid, model, object_id, action, created)
+SELECT txid_current(), '{model}', id, 'create', created
+FROM {table} ORDER BY id;
+'''
+    DROP_CHANGE_TRIGGERS_SQL = f'''
+DROP TRIGGER {table}_change_update ON {table};
+DROP TRIGGER {table}_change_insert_delete ON {table};
+''' + DROP_CHANGE_TRIGGERS_SQL
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_partition_book'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField(verbose_name='Транзакция')),
+                ('model', models.CharField(choices=[('language', 'Язык'), ('author', 'Автор'), ('book', 'Книга')], max_length=20, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='Идентификатор объекта')),
+                ('action', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('created', models.DateTimeField(verbose_name='Дата изменения')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['txid', 'id'], name='change_txid_id'),
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS_SQL, DROP_CHANGE_TRIGGERS_SQL),
+    ]
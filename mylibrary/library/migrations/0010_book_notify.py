@@ -0,0 +1,37 @@
+from django.db import migrations
+
+NOTIFY_TRIGGER_SQL = '''
+CREATE FUNCTION library_book_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('library_book_created', json_build_object(
+        'id', NEW.id,
+        'name', NEW.name,
+        'author', NEW.author_id,
+        'language', NEW.language_id,
+        'publication_year', NEW.publication_year
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER library_book_notify
+AFTER INSERT ON library_book
+FOR EACH ROW EXECUTE FUNCTION library_book_notify();
+'''
+
+DROP_NOTIFY_TRIGGER_SQL = '''
+DROP TRIGGER library_book_notify ON library_book;
+DROP FUNCTION library_book_notify();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_change_log'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_TRIGGER_SQL, DROP_NOTIFY_TRIGGER_SQL),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_book_notify'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FanoutJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('subject', models.CharField(max_length=500, verbose_name='Тема')),
+                ('message', models.TextField(verbose_name='Текст')),
+                ('is_planned', models.BooleanField(default=False, verbose_name='Разбита на диапазоны')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FanoutPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_id', models.BigIntegerField(verbose_name='Начало диапазона')),
+                ('end_id', models.BigIntegerField(verbose_name='Конец диапазона')),
+                ('last_id', models.BigIntegerField(verbose_name='Последняя обработанная подписка')),
+                ('sent_count', models.IntegerField(default=0, verbose_name='Отправлено адресатам')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершен')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'id'], name='follow_author_id'),
+        ),
+        migrations.AddField(
+            model_name='fanoutpartition',
+            name='job',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='partitions', to='library.fanoutjob', verbose_name='Рассылка'),
+        ),
+        migrations.AddField(
+            model_name='fanoutjob',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanout_jobs', to='library.author', verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='fanoutjob',
+            name='book',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='fanout_jobs', to='library.book', verbose_name='Книга'),
+        ),
+    ]
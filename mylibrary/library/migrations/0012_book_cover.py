@@ -0,0 +1,23 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_fanout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover',
+            field=models.ImageField(blank=True, upload_to='', verbose_name='Обложка'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnail',
+            field=models.ImageField(blank=True, upload_to='', verbose_name='Миниатюра обложки'),
+        ),
+    ]
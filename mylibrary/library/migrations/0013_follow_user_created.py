@@ -0,0 +1,17 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_book_cover'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-created', '-id'], name='follow_user_created_id'),
+        ),
+    ]
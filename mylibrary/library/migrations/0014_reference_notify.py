@@ -0,0 +1,54 @@
+from django.db import migrations
+
+NOTIFY_TRIGGER_SQL = '''
+CREATE FUNCTION library_reference_notify() RETURNS trigger AS $$
+BEGIN
+    -- id = null: изменилась вся таблица (TRUNCATE)
+    PERFORM pg_notify('library_reference_changed', json_build_object(
+        'model', TG_ARGV[0],
+        'id', CASE TG_OP
+            WHEN 'DELETE' THEN OLD.id
+            WHEN 'TRUNCATE' THEN NULL
+            ELSE NEW.id
+        END
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+DROP_NOTIFY_TRIGGER_SQL = '''
+DROP FUNCTION library_reference_notify();
+'''
+
+REFERENCE_TABLES = (
+    ('language', 'library_language'),
+    ('author', 'library_author'),
+)
+
+for model, table in REFERENCE_TABLES:
+    NOTIFY_TRIGGER_SQL += f'''
+CREATE TRIGGER {table}_reference_notify
+AFTER INSERT OR UPDATE OR DELETE ON {table}
+FOR EACH ROW EXECUTE FUNCTION library_reference_notify('{model}');
+
+CREATE TRIGGER {table}_reference_truncate
+AFTER TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION library_reference_notify('{model}');
+'''
+    DROP_NOTIFY_TRIGGER_SQL = f'''
+DROP TRIGGER {table}_reference_truncate ON {table};
+DROP TRIGGER {table}_reference_notify ON {table};
+''' + DROP_NOTIFY_TRIGGER_SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_follow_user_created'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_TRIGGER_SQL, DROP_NOTIFY_TRIGGER_SQL),
+    ]
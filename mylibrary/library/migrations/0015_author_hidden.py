@@ -0,0 +1,86 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Ссылки, которые удаляются каскадом в БД, без Collector в Django
+CASCADE_FOREIGN_KEYS = (
+    ('book', 'author'),
+    ('follow', 'author'),
+    ('authoryearstat', 'author'),
+    ('fanoutjob', 'author'),
+    ('fanoutpartition', 'job'),
+)
+
+
+def set_on_delete(apps, schema_editor, action):
+    connection = schema_editor.connection
+
+    for model_name, field_name in CASCADE_FOREIGN_KEYS:
+        model = apps.get_model('library', model_name)
+        field = model._meta.get_field(field_name)
+        table = model._meta.db_table
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table)
+
+        for name, constraint in constraints.items():
+            if (not constraint['foreign_key']
+                    or constraint['columns'] != [field.column]):
+                continue
+
+            name = schema_editor.quote_name(name)
+            schema_editor.execute(
+                f'ALTER TABLE {table} DROP CONSTRAINT {name}, '
+                f'ADD CONSTRAINT {name} FOREIGN KEY ({field.column}) '
+                f'REFERENCES {field.related_model._meta.db_table} (id) '
+                f'{action} DEFERRABLE INITIALLY DEFERRED')
+
+
+def add_cascades(apps, schema_editor):
+    set_on_delete(apps, schema_editor, 'ON DELETE CASCADE')
+
+
+def remove_cascades(apps, schema_editor):
+    set_on_delete(apps, schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_reference_notify'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='is_hidden',
+            field=models.BooleanField(default=False, verbose_name='Скрыт'),
+        ),
+        migrations.AlterField(
+            model_name='authoryearstat',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='year_stats', to='library.author', verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='books', to='library.author', verbose_name='Автор книги'),
+        ),
+        migrations.AlterField(
+            model_name='fanoutjob',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='fanout_jobs', to='library.author', verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='followers', to='library.author', verbose_name='Автор'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(condition=models.Q(('is_hidden', True)), fields=['id'], name='author_hidden'),
+        ),
+        migrations.RunPython(add_cascades, remove_cascades),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Новая или удаленная подписка меняет число общих подписчиков автора с
+# каждым автором, на которого подписан пользователь
+REFRESH_TRIGGER_SQL = '''
+CREATE FUNCTION library_similar_author_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO library_similarauthorrefresh (author_id)
+        SELECT author_id FROM changed_follow
+        UNION
+        SELECT follow.author_id FROM library_follow follow
+        WHERE follow.user_id IN (SELECT user_id FROM changed_follow)
+        ON CONFLICT DO NOTHING;
+    ELSE
+        INSERT INTO library_similarauthorrefresh (author_id)
+        SELECT author_id FROM removed_follow
+        UNION
+        SELECT follow.author_id FROM library_follow follow
+        WHERE follow.user_id IN (SELECT user_id FROM removed_follow)
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER library_follow_similar_insert
+AFTER INSERT ON library_follow
+REFERENCING NEW TABLE AS changed_follow
+FOR EACH STATEMENT EXECUTE FUNCTION library_similar_author_refresh();
+
+CREATE TRIGGER library_follow_similar_delete
+AFTER DELETE ON library_follow
+REFERENCING OLD TABLE AS removed_follow
+FOR EACH STATEMENT EXECUTE FUNCTION library_similar_author_refresh();
+
+INSERT INTO library_similarauthorrefresh (author_id)
+SELECT DISTINCT author_id FROM library_follow;
+'''
+
+DROP_REFRESH_TRIGGER_SQL = '''
+DROP TRIGGER library_follow_similar_delete ON library_follow;
+DROP TRIGGER library_follow_similar_insert ON library_follow;
+DROP FUNCTION library_similar_author_refresh();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_author_hidden'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarAuthorRefresh',
+            fields=[
+                ('author_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Автор')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('common_followers', models.IntegerField(verbose_name='Общих подписчиков')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_authors', to='library.author', verbose_name='Автор')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.author', verbose_name='Похожий автор')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similarauthor',
+            index=models.Index(fields=['author', '-score'], name='similar_author_score'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarauthor',
+            unique_together={('author', 'similar')},
+        ),
+        migrations.RunSQL(REFRESH_TRIGGER_SQL, DROP_REFRESH_TRIGGER_SQL),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Смена года, которая переносит книгу в другую секцию, выполняется как
+# DELETE и INSERT, и AFTER INSERT срабатывает для существующей книги.
+# Триггер журнала изменений (library_book_change_insert_delete) по имени
+# срабатывает раньше и уже записал удаление этой книги в этой транзакции
+NOTIFY_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION library_book_notify() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM library_change
+        WHERE txid = txid_current() AND model = 'book'
+            AND object_id = NEW.id AND action = 'delete'
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM pg_notify('library_book_created', json_build_object(
+        'id', NEW.id,
+        'name', NEW.name,
+        'author', NEW.author_id,
+        'language', NEW.language_id,
+        'publication_year', NEW.publication_year
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+OLD_NOTIFY_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION library_book_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('library_book_created', json_build_object(
+        'id', NEW.id,
+        'name', NEW.name,
+        'author', NEW.author_id,
+        'language', NEW.language_id,
+        'publication_year', NEW.publication_year
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_similar_authors'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_FUNCTION_SQL, OLD_NOTIFY_FUNCTION_SQL),
+    ]
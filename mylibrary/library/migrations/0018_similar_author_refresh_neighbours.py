@@ -0,0 +1,53 @@
+from django.db import migrations
+
+REFRESH_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION library_similar_author_refresh() RETURNS trigger
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO library_similarauthorrefresh (author_id)
+        SELECT author_id FROM changed_follow
+        UNION
+        SELECT follow.author_id FROM library_follow follow
+        WHERE follow.user_id IN (SELECT user_id FROM changed_follow)
+        {neighbours_insert}
+        ON CONFLICT DO NOTHING;
+    ELSE
+        INSERT INTO library_similarauthorrefresh (author_id)
+        SELECT author_id FROM removed_follow
+        UNION
+        SELECT follow.author_id FROM library_follow follow
+        WHERE follow.user_id IN (SELECT user_id FROM removed_follow)
+        {neighbours_delete}
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+# Изменилось число подписчиков автора, а значит и его сходство с каждым
+# автором, у которого он в списке похожих. Авторов, в чей список он
+# может попасть заново, находит периодический полный пересчет
+NEIGHBOURS_SQL = '''UNION
+        SELECT neighbour.author_id FROM library_similarauthor neighbour
+        WHERE neighbour.similar_id IN (SELECT author_id FROM {table})'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_book_notify_moved'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            REFRESH_FUNCTION_SQL.format(
+                neighbours_insert=NEIGHBOURS_SQL.format(
+                    table='changed_follow'),
+                neighbours_delete=NEIGHBOURS_SQL.format(
+                    table='removed_follow')),
+            REFRESH_FUNCTION_SQL.format(
+                neighbours_insert='', neighbours_delete='')),
+    ]
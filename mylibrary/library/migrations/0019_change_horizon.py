@@ -0,0 +1,22 @@
+# Generated by Django 3.2.8 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0018_similar_author_refresh_neighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField(verbose_name='Транзакция')),
+                ('change_id', models.BigIntegerField(verbose_name='Запись журнала')),
+                ('pruned_at', models.DateTimeField(auto_now=True, verbose_name='Дата очистки')),
+            ],
+        ),
+    ]
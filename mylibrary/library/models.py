@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
 
 User = get_user_model()
 
@@ -12,10 +15,38 @@ class CreatedModel(models.Model):
         abstract = True
 
 
+class AuthorQuerySet(models.QuerySet):
+    def hidden(self):
+        return self.filter(is_hidden=True)
+
+
+class VisibleAuthorManager(models.Manager.from_queryset(AuthorQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_hidden=False)
+
+
 class Author(CreatedModel):
     last_name = models.CharField('Фамилия', max_length=150)
     first_name = models.CharField('Имя', max_length=150)
     middle_name = models.CharField('Отчество', max_length=150, blank=True)
+    # Скрытый автор ждет удаления командой purge_hidden_authors
+    is_hidden = models.BooleanField('Скрыт', default=False)
+
+    objects = VisibleAuthorManager()
+    all_objects = AuthorQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Поиск в админке по началу строки: UPPER(...) LIKE 'X%'
+            models.Index(
+                OpClass(Upper('last_name'), name='text_pattern_ops'),
+                name='author_last_name_prefix'),
+            models.Index(
+                OpClass(Upper('first_name'), name='text_pattern_ops'),
+                name='author_first_name_prefix'),
+            models.Index(fields=['id'], condition=models.Q(is_hidden=True),
+                         name='author_hidden'),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.middle_name} {self.last_name}'
@@ -28,27 +59,312 @@ class Language(CreatedModel):
         return self.name
 
 
+class BookQuerySet(models.QuerySet):
+    def exclude_hidden_authors(self):
+        # Скрытых авторов единицы, подзапрос читает частичный индекс
+        return self.exclude(author__in=Author.all_objects.hidden())
+
+    def facet_counts(self, limit=None):
+        """Считает книги по языкам, авторам и десятилетиям публикации.
+
+        Все три разреза считаются одним запросом с GROUPING SETS поверх
+        текущих фильтров. Значения каждого разреза отсортированы по убыванию
+        количества и обрезаются до limit.
+        """
+        sql, params = self.order_by().values(
+            'language', 'author', 'publication_year').query.sql_with_params()
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT language_id, author_id, decade, '
+                f'GROUPING(language_id), GROUPING(author_id), COUNT(*) '
+                f'FROM (SELECT language_id, author_id, '
+                f'publication_year / 10 * 10 AS decade FROM ({sql}) books) t '
+                f'GROUP BY GROUPING SETS ((language_id), (author_id), '
+                f'(decade))',
+                params)
+            rows = cursor.fetchall()
+
+        facets = {'language': [], 'author': [], 'decade': []}
+
+        for language, author, decade, no_language, no_author, count in rows:
+            if not no_language:
+                facets['language'].append(
+                    {'language': language, 'count': count})
+            elif not no_author:
+                facets['author'].append({'author': author, 'count': count})
+            else:
+                facets['decade'].append({'decade': decade, 'count': count})
+
+        for name, values in facets.items():
+            values.sort(key=lambda item: (-item['count'], item[name]))
+            facets[name] = values[:limit]
+
+        return facets
+
+
 class Book(CreatedModel):
+    # Здесь и у других ссылок на автора ON DELETE CASCADE задан в БД
+    # (миграция 0015), Django строки не собирает
     author = models.ForeignKey(
-        Author, verbose_name='Автор книги', on_delete=models.CASCADE,
+        Author, verbose_name='Автор книги', on_delete=models.DO_NOTHING,
         related_name='books')
     language = models.ForeignKey(
         Language, verbose_name='Язык книги', on_delete=models.PROTECT,
         related_name='books')
     name = models.CharField('Название книги', max_length=500)
     publication_year = models.PositiveSmallIntegerField('Год публикации')
+    cover = models.ImageField('Обложка', blank=True)
+    cover_thumbnail = models.ImageField('Миниатюра обложки', blank=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='book_name_prefix'),
+            # Фильтры и ?ordering= в API: (фильтр, поле сортировки, id)
+            models.Index(fields=['publication_year', 'id'],
+                         name='book_year_id'),
+            models.Index(fields=['created', 'id'], name='book_created_id'),
+            models.Index(fields=['author', 'publication_year', 'id'],
+                         name='book_author_year_id'),
+            models.Index(fields=['author', 'created', 'id'],
+                         name='book_author_created_id'),
+            models.Index(fields=['language', 'publication_year', 'id'],
+                         name='book_language_year_id'),
+            models.Index(fields=['language', 'created', 'id'],
+                         name='book_language_created_id'),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.publication_year}'
 
 
+class FollowQuerySet(models.QuerySet):
+    def follow_many(self, user, author_ids):
+        """Подписывает пользователя на авторов одним INSERT ... ON CONFLICT.
+
+        Несуществующие и скрытые авторы и уже оформленные подписки
+        пропускаются, поэтому повторный вызов безопасен. Возвращает число
+        новых подписок.
+        """
+        follow_table = self.model._meta.db_table
+        author_table = Author._meta.db_table
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {follow_table} (user_id, author_id, created) '
+                f'SELECT %s, id, NOW() FROM {author_table} '
+                f'WHERE id = ANY(%s) AND NOT is_hidden '
+                f'ON CONFLICT (user_id, author_id) DO NOTHING',
+                [user.pk, list(author_ids)])
+            return cursor.rowcount
+
+
 class Follow(CreatedModel):
     user = models.ForeignKey(
         User, related_name='followings', on_delete=models.CASCADE,
         verbose_name='Подписчик')
     author = models.ForeignKey(
-        Author, related_name='followers', on_delete=models.CASCADE,
+        Author, related_name='followers', on_delete=models.DO_NOTHING,
         verbose_name='Автор')
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'author')
+        indexes = [
+            # Обход подписчиков автора диапазонами id при рассылке
+            models.Index(fields=['author', 'id'], name='follow_author_id'),
+            # Подписки пользователя от новых к старым
+            models.Index(fields=['user', '-created', '-id'],
+                         name='follow_user_created_id'),
+        ]
+
+
+class LanguageYearStat(models.Model):
+    language = models.ForeignKey(
+        Language, related_name='year_stats', on_delete=models.CASCADE,
+        verbose_name='Язык')
+    publication_year = models.PositiveSmallIntegerField('Год публикации')
+    books_count = models.IntegerField('Количество книг', default=0)
+
+    class Meta:
+        unique_together = ('language', 'publication_year')
+
+
+class AuthorYearStat(models.Model):
+    author = models.ForeignKey(
+        Author, related_name='year_stats', on_delete=models.DO_NOTHING,
+        verbose_name='Автор')
+    publication_year = models.PositiveSmallIntegerField('Год публикации')
+    books_count = models.IntegerField('Количество книг', default=0)
+
+    class Meta:
+        unique_together = ('author', 'publication_year')
+
+
+class ChangeQuerySet(models.QuerySet):
+    def committed(self):
+        # Транзакции с txid меньше xmin снимка уже завершены, поэтому новых
+        # строк левее курсора не появится
+        return self.filter(txid__lt=RawSQL(
+            'txid_snapshot_xmin(txid_current_snapshot())', []))
+
+    def after(self, txid, change_id):
+        # txid >= T дает индексу (txid, id) нижнюю границу
+        return self.filter(txid__gte=txid).filter(
+            models.Q(txid__gt=txid) | models.Q(txid=txid, id__gt=change_id))
+
+    def before(self, txid, change_id):
+        return self.filter(txid__lte=txid).filter(
+            models.Q(txid__lt=txid) | models.Q(txid=txid, id__lt=change_id))
+
+    def is_pruned(self, txid, change_id):
+        """Записи после курсора удалены из журнала.
+
+        Очистка запоминает границу (ChangeHorizon) - оставленную последнюю
+        из старых записей. Курсор на ней еще действует, а курсор левее, в
+        том числе нулевой, устарел.
+        """
+        horizon = ChangeHorizon.objects.values_list(
+            'txid', 'change_id').first()
+
+        return horizon is not None and (txid, change_id) < horizon
+
+    def prune(self, created_before, batch_size):
+        """Удаляет записи старше created_before пачками по batch_size.
+
+        Удаляется начало журнала до первой завершенной записи не старше
+        created_before. Последняя запись перед ней остается, чтобы курсор
+        клиента, прочитавшего журнал до конца, не устарел. Возвращает число
+        удаленных записей.
+        """
+        committed = self.committed().order_by('txid', 'id')
+        first_new = committed.filter(created__gte=created_before).values_list(
+            'txid', 'id').first()
+        old = committed
+        if first_new is not None:
+            old = committed.before(*first_new)
+        boundary = old.reverse().values_list('txid', 'id').first()
+        if boundary is None:
+            return 0
+
+        # Граница записывается до удаления: читатель со старым курсором
+        # получит ошибку, а не журнал с пропусками
+        ChangeHorizon.objects.update_or_create(pk=1, defaults={
+            'txid': boundary[0], 'change_id': boundary[1]})
+
+        deleted = 0
+        while True:
+            ids = list(committed.before(*boundary).values_list(
+                'id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+
+            deleted += self.filter(pk__in=ids).delete()[0]
+
+
+class Change(models.Model):
+    """Запись журнала изменений каталога.
+
+    Журнал заполняют триггеры в той же транзакции, что и само изменение.
+    Порядок журнала - (txid, id).
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = (
+        (CREATE, 'Создание'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+    MODELS = (
+        ('language', 'Язык'),
+        ('author', 'Автор'),
+        ('book', 'Книга'),
+    )
+
+    txid = models.BigIntegerField('Транзакция')
+    model = models.CharField('Модель', max_length=20, choices=MODELS)
+    object_id = models.BigIntegerField('Идентификатор объекта')
+    action = models.CharField('Действие', max_length=10, choices=ACTIONS)
+    created = models.DateTimeField('Дата изменения')
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='change_txid_id'),
+        ]
+
+
+class ChangeHorizon(models.Model):
+    """Граница очистки журнала изменений, единственная строка."""
+    txid = models.BigIntegerField('Транзакция')
+    change_id = models.BigIntegerField('Запись журнала')
+    pruned_at = models.DateTimeField('Дата очистки', auto_now=True)
+
+
+class FanoutJob(CreatedModel):
+    """Рассылка подписчикам автора о новой книге.
+
+    Подписчики делятся на диапазоны Follow.id (FanoutPartition), которые
+    обрабатываются параллельно и независимо друг от друга.
+    """
+    author = models.ForeignKey(
+        Author, related_name='fanout_jobs', on_delete=models.DO_NOTHING,
+        verbose_name='Автор')
+    # library_book секционирована, ее первичный ключ (id, publication_year),
+    # поэтому внешний ключ на нее в БД невозможен
+    book = models.ForeignKey(
+        Book, related_name='fanout_jobs', on_delete=models.CASCADE,
+        db_constraint=False, verbose_name='Книга')
+    subject = models.CharField('Тема', max_length=500)
+    message = models.TextField('Текст')
+    is_planned = models.BooleanField('Разбита на диапазоны', default=False)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+
+class FanoutPartition(models.Model):
+    job = models.ForeignKey(
+        FanoutJob, related_name='partitions', on_delete=models.CASCADE,
+        verbose_name='Рассылка')
+    start_id = models.BigIntegerField('Начало диапазона')
+    end_id = models.BigIntegerField('Конец диапазона')
+    last_id = models.BigIntegerField('Последняя обработанная подписка')
+    sent_count = models.IntegerField('Отправлено адресатам', default=0)
+    finished_at = models.DateTimeField('Завершен', null=True, blank=True)
+
+
+class SimilarAuthor(models.Model):
+    """Похожий автор: косинусная мера по общим подписчикам.
+
+    Для каждого автора хранится не больше SIMILAR_AUTHORS_TOP_K строк,
+    их пересчитывает команда refresh_similar_authors.
+    """
+    author = models.ForeignKey(
+        Author, related_name='similar_authors', on_delete=models.CASCADE,
+        verbose_name='Автор')
+    similar = models.ForeignKey(
+        Author, related_name='+', on_delete=models.CASCADE,
+        verbose_name='Похожий автор')
+    score = models.FloatField('Сходство')
+    common_followers = models.IntegerField('Общих подписчиков')
+
+    class Meta:
+        unique_together = ('author', 'similar')
+        indexes = [
+            models.Index(fields=['author', '-score'],
+                         name='similar_author_score'),
+        ]
+
+
+class SimilarAuthorRefresh(models.Model):
+    """Автор, у которого изменились подписчики или их подписки.
+
+    Очередь заполняет триггер на library_follow.
+    """
+    author_id = models.BigIntegerField('Автор', primary_key=True)
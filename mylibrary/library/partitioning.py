@@ -0,0 +1,217 @@
+import json
+from datetime import datetime
+
+from django.db import connections
+
+BOOK_TABLE = 'library_book'
+BOOK_PARTITION_COLUMN = 'publication_year'
+BOOK_DEFAULT_PARTITION = f'{BOOK_TABLE}_default'
+
+# Годы до 1900 лежат в одной секции, XX и XXI век до 2020 - по десятилетиям,
+# дальше - по годам. Годовые секции на будущее добавляет add_book_partitions
+BOOK_FIRST_DECADE = 1900
+BOOK_FIRST_YEAR = 2020
+BOOK_PARTITIONS_AHEAD = 5
+
+
+def get_book_partition_bounds(last_year):
+    bounds = [(f'{BOOK_TABLE}_before_{BOOK_FIRST_DECADE}', 'MINVALUE',
+               BOOK_FIRST_DECADE)]
+    bounds += [(f'{BOOK_TABLE}_d{decade}', decade, decade + 10)
+               for decade in range(BOOK_FIRST_DECADE, BOOK_FIRST_YEAR, 10)]
+    bounds += [(f'{BOOK_TABLE}_y{year}', year, year + 1)
+               for year in range(BOOK_FIRST_YEAR, last_year + 1)]
+
+    return bounds
+
+
+def get_year_partition_name(year):
+    return f'{BOOK_TABLE}_y{year}'
+
+
+def _fetch_definitions(cursor, table):
+    cursor.execute(
+        'SELECT confrelid::regclass::text FROM pg_constraint '
+        'WHERE confrelid = %s::regclass AND contype = %s', [table, 'f'])
+    referencing = [row[0] for row in cursor.fetchall()]
+    if referencing:
+        raise ValueError(
+            f'На {table} ссылаются внешние ключи, их нужно удалить до '
+            f'перестройки таблицы')
+
+    cursor.execute(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        'WHERE conrelid = %s::regclass AND contype IN (%s, %s) '
+        'ORDER BY conname', [table, 'f', 'c'])
+    constraints = cursor.fetchall()
+
+    cursor.execute(
+        'SELECT i.indexrelid::regclass::text, '
+        'pg_get_indexdef(i.indexrelid) FROM pg_index i '
+        'WHERE i.indrelid = %s::regclass AND NOT i.indisprimary '
+        'ORDER BY 1', [table])
+    indexes = cursor.fetchall()
+
+    cursor.execute(
+        'SELECT pg_get_triggerdef(oid) FROM pg_trigger '
+        'WHERE tgrelid = %s::regclass AND NOT tgisinternal '
+        'ORDER BY tgname', [table])
+    triggers = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+    sequence = cursor.fetchone()[0]
+
+    return constraints, indexes, triggers, sequence
+
+
+def _rebuild_table(cursor, table, create_sql):
+    """Пересоздает таблицу с тем же содержимым и объектами вокруг нее.
+
+    Ограничения, индексы и триггеры переносятся по определениям из
+    каталога, последовательность id остается прежней. create_sql получает
+    имя новой и старой таблицы и должен создать новую вместе с ее секциями.
+    """
+    constraints, indexes, triggers, sequence = _fetch_definitions(
+        cursor, table)
+    old_table = f'{table}_old'
+
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {old_table}')
+    cursor.execute(
+        f'ALTER TABLE {old_table} RENAME CONSTRAINT {table}_pkey '
+        f'TO {old_table}_pkey')
+    for name, definition in indexes:
+        cursor.execute(f'DROP INDEX {name}')
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+
+    create_sql(cursor, table, old_table)
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {old_table}')
+
+    for name, definition in constraints:
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    for name, definition in indexes:
+        cursor.execute(definition)
+    for definition in triggers:
+        cursor.execute(definition)
+
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    cursor.execute(f'DROP TABLE {old_table}')
+    cursor.execute(f'ANALYZE {table}')
+
+
+def partition_book_table(cursor, last_year=None):
+    if last_year is None:
+        last_year = datetime.now().year + BOOK_PARTITIONS_AHEAD
+
+    def create_sql(cursor, table, old_table):
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS '
+            f'INCLUDING STORAGE INCLUDING COMMENTS) '
+            f'PARTITION BY RANGE ({BOOK_PARTITION_COLUMN})')
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey '
+            f'PRIMARY KEY (id, {BOOK_PARTITION_COLUMN})')
+
+        for name, start, end in get_book_partition_bounds(last_year):
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {table} '
+                f'FOR VALUES FROM ({start}) TO ({end})')
+        cursor.execute(
+            f'CREATE TABLE {BOOK_DEFAULT_PARTITION} PARTITION OF {table} '
+            f'DEFAULT')
+
+    _rebuild_table(cursor, BOOK_TABLE, create_sql)
+
+
+def unpartition_book_table(cursor):
+    def create_sql(cursor, table, old_table):
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS '
+            f'INCLUDING STORAGE INCLUDING COMMENTS)')
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey '
+            f'PRIMARY KEY (id)')
+
+    _rebuild_table(cursor, BOOK_TABLE, create_sql)
+
+
+def get_book_partitions(cursor):
+    cursor.execute(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+        'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass ORDER BY c.relname', [BOOK_TABLE])
+
+    return cursor.fetchall()
+
+
+def add_year_partition(cursor, year):
+    """Добавляет годовую секцию книг, если ее еще нет.
+
+    Строки этого года, попавшие в секцию по умолчанию, переносятся в новую
+    секцию. Пользовательские триггеры секции по умолчанию на время переноса
+    отключаются: для остальной системы книги не удаляются и не создаются.
+    Возвращает число перенесенных строк или None, если секция уже есть.
+    """
+    name = get_year_partition_name(year)
+
+    cursor.execute('SELECT to_regclass(%s)', [name])
+    if cursor.fetchone()[0] is not None:
+        return None
+
+    cursor.execute(
+        f'SELECT COUNT(*) FROM {BOOK_DEFAULT_PARTITION} '
+        f'WHERE {BOOK_PARTITION_COLUMN} >= %s '
+        f'AND {BOOK_PARTITION_COLUMN} < %s', [year, year + 1])
+    moved = cursor.fetchone()[0]
+
+    if not moved:
+        cursor.execute(
+            f'CREATE TABLE {name} PARTITION OF {BOOK_TABLE} '
+            f'FOR VALUES FROM ({year}) TO ({year + 1})')
+        return moved
+
+    cursor.execute(
+        f'CREATE TABLE {name} (LIKE {BOOK_TABLE} INCLUDING DEFAULTS '
+        f'INCLUDING CONSTRAINTS INCLUDING STORAGE)')
+    cursor.execute(
+        f'ALTER TABLE {BOOK_DEFAULT_PARTITION} DISABLE TRIGGER USER')
+    cursor.execute(
+        f'INSERT INTO {name} SELECT * FROM {BOOK_DEFAULT_PARTITION} '
+        f'WHERE {BOOK_PARTITION_COLUMN} >= %s '
+        f'AND {BOOK_PARTITION_COLUMN} < %s', [year, year + 1])
+    cursor.execute(
+        f'DELETE FROM {BOOK_DEFAULT_PARTITION} '
+        f'WHERE {BOOK_PARTITION_COLUMN} >= %s '
+        f'AND {BOOK_PARTITION_COLUMN} < %s', [year, year + 1])
+    cursor.execute(
+        f'ALTER TABLE {BOOK_DEFAULT_PARTITION} ENABLE TRIGGER USER')
+    cursor.execute(
+        f'ALTER TABLE {BOOK_TABLE} ATTACH PARTITION {name} '
+        f'FOR VALUES FROM ({year}) TO ({year + 1})')
+
+    return moved
+
+
+def get_scanned_relations(plan):
+    relations = set()
+    if 'Relation Name' in plan:
+        relations.add(plan['Relation Name'])
+
+    for child in plan.get('Plans', ()):
+        relations |= get_scanned_relations(child)
+
+    return relations
+
+
+def explain(queryset, analyze=False):
+    sql, params = queryset.query.sql_with_params()
+    options = 'ANALYZE, BUFFERS, ' if analyze else ''
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN ({options}FORMAT JSON) {sql}', params)
+        result = cursor.fetchone()[0]
+
+    if isinstance(result, str):
+        result = json.loads(result)
+
+    return result[0]
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from library.models import (Author, Follow, SimilarAuthor,
+                            SimilarAuthorRefresh)
+
+# Число общих подписчиков для каждой пары, где первый автор из списка,
+# нормируется на подписчиков обоих авторов: common / sqrt(n_a * n_b).
+# Соединение идет только по подписчикам выбранных авторов, а не по всей
+# матрице подписок, поэтому пачка стоит пропорционально их аудитории.
+REFRESH_SQL = '''
+WITH pairs AS (
+    SELECT source.author_id, target.author_id AS similar_id,
+        COUNT(*) AS common_followers
+    FROM {follow} source
+    JOIN {follow} target ON target.user_id = source.user_id
+        AND target.author_id <> source.author_id
+    WHERE source.author_id = ANY(%(author_ids)s)
+    GROUP BY source.author_id, target.author_id
+    HAVING COUNT(*) >= %(min_common)s
+),
+followers AS (
+    SELECT author_id, COUNT(*) AS followers_count
+    FROM {follow}
+    WHERE author_id IN (
+        SELECT author_id FROM pairs UNION SELECT similar_id FROM pairs)
+    GROUP BY author_id
+),
+ranked AS (
+    SELECT pairs.author_id, pairs.similar_id, pairs.common_followers,
+        pairs.common_followers / sqrt(
+            source.followers_count::float * target.followers_count) AS score
+    FROM pairs
+    JOIN followers source ON source.author_id = pairs.author_id
+    JOIN followers target ON target.author_id = pairs.similar_id
+    JOIN {author} author ON author.id = pairs.similar_id
+    WHERE NOT author.is_hidden
+),
+top AS (
+    SELECT *, row_number() OVER (
+        PARTITION BY author_id ORDER BY score DESC, similar_id) AS position
+    FROM ranked
+)
+INSERT INTO {similar} (author_id, similar_id, score, common_followers)
+SELECT author_id, similar_id, score, common_followers
+FROM top
+WHERE position <= %(top_k)s
+'''
+
+
+def refresh_similar_authors(author_ids, top_k=None, min_common=None):
+    """Пересчитывает похожих авторов для списка авторов одним запросом."""
+    top_k = top_k or settings.SIMILAR_AUTHORS_TOP_K
+    min_common = min_common or settings.SIMILAR_AUTHORS_MIN_COMMON
+    author_ids = list(author_ids)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SimilarAuthor._meta.db_table} '
+            f'WHERE author_id = ANY(%s)', [author_ids])
+        cursor.execute(REFRESH_SQL.format(
+            follow=Follow._meta.db_table,
+            author=Author._meta.db_table,
+            similar=SimilarAuthor._meta.db_table,
+        ), {'author_ids': author_ids, 'top_k': top_k,
+            'min_common': min_common})
+
+        return cursor.rowcount
+
+
+def refresh_pending(batch_size=None):
+    """Пересчитывает пачку авторов из очереди SimilarAuthorRefresh.
+
+    Очередь разбирается в той же транзакции, что и пересчет, поэтому
+    прерванная пачка вернется в очередь, а несколько процессов не возьмут
+    одних и тех же авторов. Возвращает число пересчитанных авторов.
+    """
+    batch_size = batch_size or settings.SIMILAR_AUTHORS_BATCH_SIZE
+    table = SimilarAuthorRefresh._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE author_id IN ('
+            f'    SELECT author_id FROM {table} ORDER BY author_id '
+            f'    LIMIT %s FOR UPDATE SKIP LOCKED) '
+            f'RETURNING author_id', [batch_size])
+        author_ids = [row[0] for row in cursor.fetchall()]
+
+        if author_ids:
+            refresh_similar_authors(author_ids)
+
+    return len(author_ids)
+
+
+def rebuild_similar_authors(batch_size=None):
+    """Пересчитывает всех авторов с подписчиками пачками по id."""
+    batch_size = batch_size or settings.SIMILAR_AUTHORS_BATCH_SIZE
+    last_id = 0
+    refreshed = 0
+
+    SimilarAuthor.objects.exclude(
+        author__in=Follow.objects.values('author')).delete()
+
+    while True:
+        author_ids = list(Follow.objects.filter(
+            author_id__gt=last_id).order_by('author_id').values_list(
+            'author_id', flat=True).distinct()[:batch_size])
+        if not author_ids:
+            return refreshed
+
+        refresh_similar_authors(author_ids)
+        refreshed += len(author_ids)
+        last_id = author_ids[-1]
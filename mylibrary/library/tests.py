@@ -0,0 +1,328 @@
+import time
+from datetime import datetime
+
+import psycopg2
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.paginator import EstimatedCountPaginator
+from library.cache import author_cache, language_cache
+from library.deletion import hide_author, purge_hidden_authors
+from library.fanout import FanoutError, run_fanout_job
+from library.models import (Author, AuthorYearStat, Book, FanoutJob,
+                            FanoutPartition, Follow, Language, SimilarAuthor,
+                            SimilarAuthorRefresh)
+from library.partitioning import (BOOK_DEFAULT_PARTITION, explain,
+                                  get_scanned_relations,
+                                  get_year_partition_name)
+from library.similarity import refresh_pending
+
+User = get_user_model()
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'admin-pass')
+        cls.language = Language.objects.create(name='Русский')
+        cls.author = Author.objects.create(
+            first_name='Лев', middle_name='Николаевич', last_name='Толстой')
+        cls.book = Book.objects.create(
+            name='Война и Мир', publication_year=1867, language=cls.language,
+            author=cls.author)
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_do_not_query_per_row(self):
+        for model, queries in ((Book, 6), (Follow, 5)):
+            url = reverse(
+                f'admin:library_{model._meta.model_name}_changelist')
+
+            with self.subTest(model=model), self.assertNumQueries(queries):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+
+    def test_search_and_filter(self):
+        url = reverse('admin:library_book_changelist')
+
+        response = self.client.get(url, {'q': 'война', 'century': '19'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.book])
+
+    def test_author_autocomplete(self):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'тол', 'app_label': 'library', 'model_name': 'book',
+            'field_name': 'author'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [str(self.author.pk)])
+
+    def test_paginator_uses_estimate_for_large_tables(self):
+        queryset = Book.objects.order_by('pk')
+
+        paginator = EstimatedCountPaginator(queryset, 20)
+        self.assertEqual(paginator.count, 1)
+
+        paginator = EstimatedCountPaginator(queryset, 20)
+        paginator.exact_count_threshold = 0
+        with self.assertNumQueries(1):
+            self.assertIsInstance(paginator.count, int)
+
+
+class PartitioningTests(TestCase):
+    def test_visible_books_skip_future_partitions(self):
+        year = datetime.now().year
+        queryset = Book.objects.filter(publication_year__lte=year)
+
+        scanned = get_scanned_relations(explain(queryset)['Plan'])
+
+        self.assertIn(get_year_partition_name(year), scanned)
+        self.assertNotIn(get_year_partition_name(year + 1), scanned)
+        self.assertNotIn(BOOK_DEFAULT_PARTITION, scanned)
+
+    def test_book_lands_in_year_partition(self):
+        language = Language.objects.create(name='Английский')
+        author = Author.objects.create(first_name='Джон', last_name='Смит')
+        book = Book.objects.create(
+            name='Книга', publication_year=1955, language=language,
+            author=author)
+
+        book.publication_year = 2021
+        book.save()
+
+        queryset = Book.objects.filter(pk=book.pk, publication_year=2021)
+        self.assertEqual(
+            get_scanned_relations(explain(queryset)['Plan']),
+            {get_year_partition_name(2021)})
+        self.assertEqual(queryset.count(), 1)
+
+
+@override_settings(FANOUT_PARTITION_SIZE=2, FANOUT_BATCH_SIZE=2,
+                   DEFAULT_FROM_EMAIL='noreply@example.com')
+class FanoutTests(TransactionTestCase):
+    # Диапазоны обрабатываются в других потоках, им нужны закоммиченные данные
+    def setUp(self):
+        language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        book = Book.objects.create(
+            name='Война и Мир', publication_year=1867, language=language,
+            author=self.author)
+
+        self.emails = []
+        for number in range(5):
+            email = f'reader{number}@example.com'
+            user = User.objects.create_user(f'reader{number}', email)
+            Follow.objects.create(user=user, author=self.author)
+            self.emails.append(email)
+
+        self.job = FanoutJob.objects.create(
+            author=self.author, book=book, subject='Новая книга',
+            message='Текст')
+
+    def get_recipients(self):
+        return sorted(email for message in mail.outbox
+                      for email in message.bcc)
+
+    def test_partitions_are_sent_in_parallel(self):
+        self.assertEqual(run_fanout_job(self.job, workers=3), 5)
+
+        self.assertEqual(self.job.partitions.count(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(self.get_recipients(), self.emails)
+        self.job.refresh_from_db()
+        self.assertIsNotNone(self.job.finished_at)
+
+        self.assertEqual(run_fanout_job(self.job, workers=3), 0)
+
+    def test_fanout_resumes_from_checkpoint(self):
+        follow_ids = list(Follow.objects.order_by('id').values_list(
+            'id', flat=True))
+        run_fanout_job(self.job, workers=1)
+        mail.outbox.clear()
+
+        # Сбой после первого письма второго диапазона
+        partition = self.job.partitions.order_by('start_id')[1]
+        partition.last_id = follow_ids[2]
+        partition.finished_at = None
+        partition.save()
+        FanoutJob.objects.filter(pk=self.job.pk).update(finished_at=None)
+
+        self.assertEqual(run_fanout_job(self.job, workers=2), 1)
+        self.assertEqual(self.get_recipients(), [self.emails[3]])
+
+    @override_settings(DEFAULT_FROM_EMAIL='')
+    def test_failed_send_does_not_advance_partition(self):
+        with self.assertRaises(FanoutError):
+            run_fanout_job(self.job, workers=1)
+
+        partition = self.job.partitions.order_by('start_id').first()
+        self.assertEqual(partition.last_id, partition.start_id - 1)
+        self.assertEqual(partition.sent_count, 0)
+        self.assertIsNone(partition.finished_at)
+        self.job.refresh_from_db()
+        self.assertIsNone(self.job.finished_at)
+
+
+class ReferenceCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+
+    def test_cached_rows_are_read_without_queries(self):
+        language_cache.get(self.language.pk)
+        author_cache.get(self.author.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                language_cache.get(self.language.pk).name, 'Русский')
+            self.assertEqual(
+                author_cache.get(self.author.pk).last_name, 'Толстой')
+            self.assertIsNone(language_cache.get(self.language.pk + 1))
+
+    @override_settings(AUTHOR_CACHE_SIZE=1)
+    def test_author_cache_size_is_read_from_settings(self):
+        other = Author.objects.create(first_name='Жюль', last_name='Верн')
+
+        author_cache.get(self.author.pk)
+        author_cache.get(other.pk)
+
+        self.assertEqual(list(author_cache.items), [other.pk])
+
+    def test_save_invalidates_cache(self):
+        author_cache.get(self.author.pk)
+
+        self.author.last_name = 'Толстой-младший'
+        self.author.save()
+
+        self.assertEqual(author_cache.get(self.author.pk).last_name,
+                         'Толстой-младший')
+
+    def test_commit_in_other_process_invalidates_cache(self):
+        language_cache.get(self.language.pk)
+
+        # Изменение из другого процесса: мимо сигналов Django
+        other = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with other, other.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE library_language SET name = %s WHERE id = %s',
+                    ['Английский', self.language.pk])
+        finally:
+            other.close()
+
+        deadline = time.monotonic() + 2
+        while (language_cache.get(self.language.pk).name != 'Английский'
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+
+        self.assertEqual(
+            language_cache.get(self.language.pk).name, 'Английский')
+
+
+class AuthorDeletionTests(TestCase):
+    def setUp(self):
+        language = Language.objects.create(name='Русский')
+        self.author = Author.objects.create(
+            first_name='Лев', last_name='Толстой')
+        books = Book.objects.bulk_create(
+            Book(name=f'Книга {number}', publication_year=1850 + number * 30,
+                 language=language, author=self.author)
+            for number in range(5))
+        for number in range(3):
+            user = User.objects.create_user(f'reader{number}')
+            Follow.objects.create(user=user, author=self.author)
+        job = FanoutJob.objects.create(
+            author=self.author, book=books[0], subject='Новая книга',
+            message='Текст')
+        FanoutPartition.objects.create(job=job, start_id=1, end_id=1,
+                                       last_id=0)
+
+    def test_hidden_author_disappears_at_once(self):
+        hide_author(self.author)
+
+        self.assertFalse(Author.objects.filter(pk=self.author.pk).exists())
+        self.assertTrue(Author.all_objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Book.objects.exclude_hidden_authors().exists())
+        user = User.objects.create_user('new-reader')
+        self.assertEqual(Follow.objects.follow_many(user, [self.author.pk]),
+                         0)
+
+    def test_purge_deletes_in_batches_and_cascades(self):
+        hide_author(self.author)
+
+        with CaptureQueriesContext(connection) as queries:
+            purged = purge_hidden_authors(batch_size=2)
+
+        # Книги и подписки не загружаются в Python и удаляются пачками
+        statements = [query['sql'] for query in queries]
+        self.assertFalse([sql for sql in statements if sql.startswith(
+            ('SELECT "library_book"', 'SELECT "library_follow"'))])
+        self.assertEqual(len([sql for sql in statements if sql.startswith(
+            'DELETE FROM library_book')]), 3)
+
+        self.assertEqual(purged, {self.author.pk: {'follows': 3,
+                                                   'books': 5}})
+        self.assertFalse(Author.all_objects.exists())
+        self.assertFalse(AuthorYearStat.objects.exists())
+        self.assertFalse(FanoutJob.objects.exists())
+        self.assertFalse(FanoutPartition.objects.exists())
+
+
+@override_settings(SIMILAR_AUTHORS_MIN_COMMON=1, SIMILAR_AUTHORS_TOP_K=2)
+class SimilarAuthorTests(TestCase):
+    def setUp(self):
+        self.authors = Author.objects.bulk_create(
+            Author(first_name='Автор', last_name=name) for name in 'ABCD')
+        a, b, c, d = self.authors
+        self.users = []
+        for number, authors in enumerate(([a, b, c], [a, b], [a, b, d],
+                                          [c, d])):
+            user = User.objects.create_user(f'similar{number}')
+            Follow.objects.follow_many(user, [author.pk for author in authors])
+            self.users.append(user)
+
+    def get_similar(self, author):
+        return [(item.similar, round(item.score, 3))
+                for item in SimilarAuthor.objects.filter(
+                    author=author).order_by('-score', 'similar')]
+
+    def test_refresh_builds_top_k_by_cosine(self):
+        a, b, c, d = self.authors
+
+        self.assertEqual(refresh_pending(), 4)
+
+        # У A и B три общих подписчика из трех: сходство 1
+        self.assertEqual(self.get_similar(a), [(b, 1.0), (c, 0.408)])
+        # B тоже похож на C на 0.408, но не входит в два лучших
+        self.assertEqual(self.get_similar(c), [(d, 0.5), (a, 0.408)])
+        self.assertFalse(SimilarAuthorRefresh.objects.exists())
+
+    def test_unfollow_queues_co_followed_authors(self):
+        a, b, c, d = self.authors
+        refresh_pending()
+
+        Follow.objects.filter(user=self.users[3], author=c).delete()
+
+        # У A, B и D автор C в списке похожих, а у C стало меньше
+        # подписчиков
+        self.assertEqual(
+            set(SimilarAuthorRefresh.objects.values_list(
+                'author_id', flat=True)), {a.pk, b.pk, c.pk, d.pk})
+        refresh_pending()
+        self.assertEqual(self.get_similar(c), [(a, 0.577), (b, 0.577)])
+        self.assertEqual(self.get_similar(a), [(b, 1.0), (c, 0.577)])
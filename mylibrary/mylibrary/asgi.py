@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mylibrary.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт моделей возможен только после настройки Django
+from api.streaming import BookStreamApplication  # noqa: E402
+
+application = BookStreamApplication(django_application)
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+
+# Замеры benchmark_gunicorn пока не показали выигрыша gthread перед sync,
+# поэтому по умолчанию sync. gthread включается через
+# GUNICORN_WORKER_CLASS=gthread и GUNICORN_THREADS > 1 (с sync и
+# несколькими потоками gunicorn сам выбирает gthread). Каждый поток держит
+# свое соединение с БД (POSTGRES_CONN_MAX_AGE), всего их workers * threads
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Дольше keepalive_timeout в upstream nginx: соединение закрывает nginx, и
+# запрос не попадает в соединение, которое закрывает gunicorn
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Перезапуск воркера ограничивает рост памяти, разброс не дает всем
+# воркерам перезапуститься одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Файл heartbeat в памяти, а не в overlay-файловой системе контейнера
+worker_tmp_dir = os.getenv('GUNICORN_WORKER_TMP_DIR', '/dev/shm')
+
+
+def post_worker_init(worker):
+    # Приложение уже загружено в воркер, но ни одного запроса еще не было
+    if not int(os.getenv('GUNICORN_WARMUP', 1)):
+        return
+
+    from core.warmup import warm_up
+
+    try:
+        timings = warm_up()
+    except Exception:
+        worker.log.exception('Worker warm-up failed')
+        return
+
+    worker.log.info('Worker warmed up: %s', ', '.join(
+        f'{name} {seconds * 1000:.1f}ms' for name, seconds in timings))
@@ -32,20 +32,24 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.postgres',
     'django_filters',
+    'core',
     'users',
     'library',
     'api',
+    'webhooks',
     'djoser',
     'drf_yasg',
     'rest_framework'
 ]
 
 MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,8 +85,19 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
         'PORT': os.getenv('POSTGRES_PORT'),
+        # Каждое новое соединение сбрасывает кеши справочников процесса
+        # (library.cache.listen): меньшее значение чаще их опустошает
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
     }}
 
+if os.getenv('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.getenv('MEMCACHED_LOCATION'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -119,6 +134,19 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static"
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+# Файлы отдает nginx из internal-локации, Django только проверяет доступ
+MEDIA_ACCEL_REDIRECT = bool(int(os.getenv('MEDIA_ACCEL_REDIRECT', 0)))
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Меняется вместе с client_max_body_size в nginx/nginx.conf, который
+# ограничивает все тело запроса и должен быть немного больше
+BOOK_COVER_MAX_SIZE = int(os.getenv('BOOK_COVER_MAX_SIZE', 10 * 1024 * 1024))
+BOOK_COVER_THUMBNAIL_WORKERS = int(
+    os.getenv('BOOK_COVER_THUMBNAIL_WORKERS', 2))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -134,9 +162,28 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS':
+        'api.pagination.EstimatedLimitOffsetPagination',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ScopedActionThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'search': os.getenv('THROTTLE_RATE_SEARCH', '60/min'),
+        'create': os.getenv('THROTTLE_RATE_CREATE', '120/min'),
+        'follow': os.getenv('THROTTLE_RATE_FOLLOW', '120/min'),
+    },
+    'EXCEPTION_HANDLER': 'api.exceptions.exception_handler',
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
 
+# Лимиты времени запросов к БД в миллисекундах, 0 - без лимита
+STATEMENT_TIMEOUTS = {
+    'read': int(os.getenv('STATEMENT_TIMEOUT_READ', 5000)),
+    'search': int(os.getenv('STATEMENT_TIMEOUT_SEARCH', 2000)),
+}
+STATEMENT_TIMEOUT_RETRY_AFTER = int(
+    os.getenv('STATEMENT_TIMEOUT_RETRY_AFTER', 5))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -166,3 +213,58 @@ except ValueError:
 ADMINS = [
     ('admin', os.getenv('EMAIL_ADMIN')),
 ]
+
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 50))
+WEBHOOK_CONCURRENCY = int(os.getenv('WEBHOOK_CONCURRENCY', 10))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 10))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8))
+WEBHOOK_RETRY_DELAY = int(os.getenv('WEBHOOK_RETRY_DELAY', 30))
+WEBHOOK_LEASE = int(os.getenv('WEBHOOK_LEASE', 600))
+# Срок хранения доставленных событий
+WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', 7))
+WEBHOOK_PRUNE_BATCH_SIZE = int(os.getenv('WEBHOOK_PRUNE_BATCH_SIZE', 10000))
+
+FANOUT_PARTITION_SIZE = int(os.getenv('FANOUT_PARTITION_SIZE', 10000))
+FANOUT_BATCH_SIZE = int(os.getenv('FANOUT_BATCH_SIZE', 100))
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', 4))
+
+# Доля трассируемых запросов от 0 до 1, экспорт в файл или OTLP-коллектор
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0))
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file')
+TRACING_FILE = os.getenv('TRACING_FILE', BASE_DIR / 'traces.jsonl')
+TRACING_OTLP_ENDPOINT = os.getenv(
+    'TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'mylibrary')
+
+# Профилирование запросов сотрудников по заголовку X-Profile
+PROFILING_ENABLED = int(os.getenv('PROFILING_ENABLED', 1))
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.005))
+PROFILING_ROOT = os.getenv('PROFILING_ROOT', MEDIA_ROOT / 'profiles')
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 100))
+
+# Кеш языков и авторов в памяти процесса, сбрасывается по NOTIFY
+REFERENCE_CACHE_ENABLED = int(os.getenv('REFERENCE_CACHE_ENABLED', 1))
+AUTHOR_CACHE_SIZE = int(os.getenv('AUTHOR_CACHE_SIZE', 10000))
+
+AUTHOR_PURGE_BATCH_SIZE = int(os.getenv('AUTHOR_PURGE_BATCH_SIZE', 1000))
+
+SIMILAR_AUTHORS_TOP_K = int(os.getenv('SIMILAR_AUTHORS_TOP_K', 20))
+SIMILAR_AUTHORS_MIN_COMMON = int(os.getenv('SIMILAR_AUTHORS_MIN_COMMON', 2))
+SIMILAR_AUTHORS_BATCH_SIZE = int(os.getenv('SIMILAR_AUTHORS_BATCH_SIZE', 100))
+
+# Срок хранения журнала изменений: более старый курсор получает 410
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', 30))
+CHANGE_LOG_PRUNE_BATCH_SIZE = int(
+    os.getenv('CHANGE_LOG_PRUNE_BATCH_SIZE', 10000))
+
+# Пакетные запросы /api/v1/batch/
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 10))
+BATCH_MAX_COST = int(os.getenv('BATCH_MAX_COST', 20))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 4))
+
+# Снимок каталога для новых установок приложения
+SNAPSHOT_ROOT = os.getenv('SNAPSHOT_ROOT', MEDIA_ROOT / 'snapshots')
+SNAPSHOT_MAX_DELTAS = int(os.getenv('SNAPSHOT_MAX_DELTAS', 48))
+SNAPSHOT_MAX_DELTA_CHANGES = int(
+    os.getenv('SNAPSHOT_MAX_DELTA_CHANGES', 10000))
+SNAPSHOT_FILE_TTL = int(os.getenv('SNAPSHOT_FILE_TTL', 3600))
@@ -5,14 +5,16 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.conf.urls import url
 
+api_info = openapi.Info(
+    title="Test Task API",
+    default_version='v1',
+    description="Документация для aitarget Test Task",
+    contact=openapi.Contact(email="igor.shatava@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Test Task API",
-        default_version='v1',
-        description="Документация для aitarget Test Task",
-        contact=openapi.Contact(email="igor.shatava@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
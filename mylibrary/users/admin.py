@@ -1,5 +1,24 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+
+from core.paginator import EstimatedCountPaginator
 
 from .models import User
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    fieldsets = (
+        (None, {'fields': ('username', 'password')}),
+        ('Персональные данные', {
+            'fields': ('last_name', 'first_name', 'middle_name', 'email')}),
+        ('Права доступа', {
+            'fields': ('is_active', 'is_staff', 'is_superuser', 'groups',
+                       'user_permissions')}),
+        ('Даты', {'fields': ('last_login', 'date_joined')}),
+    )
+    list_display = ('username', 'email', 'last_name', 'first_name',
+                    'is_staff')
+    search_fields = ('^username', '^email', '^last_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
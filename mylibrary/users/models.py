@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class User(AbstractUser):
@@ -7,3 +9,16 @@ class User(AbstractUser):
     first_name = models.CharField('Имя', max_length=150)
     middle_name = models.CharField('Отчество', max_length=150, blank=True)
     email = models.EmailField('Email')
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(
+                OpClass(Upper('username'), name='text_pattern_ops'),
+                name='user_username_prefix'),
+            models.Index(
+                OpClass(Upper('email'), name='text_pattern_ops'),
+                name='user_email_prefix'),
+            models.Index(
+                OpClass(Upper('last_name'), name='text_pattern_ops'),
+                name='user_last_name_prefix'),
+        ]
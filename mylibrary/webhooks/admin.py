@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from core.paginator import EstimatedCountPaginator
+
+from .models import WebhookEvent, WebhookSubscription
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('url', 'event_type', 'is_active', 'created')
+    list_filter = ('event_type', 'is_active')
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subscription', 'event_type', 'attempts',
+                    'next_attempt_at', 'delivered_at')
+    list_select_related = ('subscription',)
+    raw_id_fields = ('subscription',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
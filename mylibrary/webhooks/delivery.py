@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from webhooks.models import WebhookEvent
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+TIMESTAMP_HEADER = 'X-Webhook-Timestamp'
+MAX_RETRY_DELAY = 3600
+
+
+def sign(secret, timestamp, body):
+    message = f'{timestamp}.'.encode() + body
+
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def get_retry_delay(attempts):
+    # Разброс нужен, чтобы повторы к упавшему получателю не шли пачкой
+    delay = min(settings.WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1),
+                MAX_RETRY_DELAY)
+
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def build_batches(events, batch_size):
+    events_by_subscription = defaultdict(list)
+    for event in events:
+        events_by_subscription[event.subscription].append(event)
+
+    return [(subscription, subscription_events[start:start + batch_size])
+            for subscription, subscription_events
+            in events_by_subscription.items()
+            for start in range(0, len(subscription_events), batch_size)]
+
+
+def build_request(subscription, events):
+    body = json.dumps({'events': [{
+        'id': event.id,
+        'type': event.event_type,
+        'created': event.created,
+        'data': event.payload,
+    } for event in events]}, cls=DjangoJSONEncoder,
+        ensure_ascii=False).encode()
+    timestamp = str(int(time.time()))
+    signature = sign(subscription.secret, timestamp, body)
+
+    return subscription.url, body, {
+        'Content-Type': 'application/json',
+        TIMESTAMP_HEADER: timestamp,
+        SIGNATURE_HEADER: f'sha256={signature}',
+    }
+
+
+async def post_requests(requests, concurrency, timeout):
+    """Отправляет запросы через один клиент с keep-alive соединениями.
+
+    Одновременно выполняется не больше concurrency запросов. Возвращает для
+    каждого запроса None или описание ошибки.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def post(url, body, headers):
+            async with semaphore:
+                try:
+                    response = await client.post(
+                        url, content=body, headers=headers)
+                except httpx.HTTPError as error:
+                    return f'{error.__class__.__name__}: {error}'
+
+            if not response.is_success:
+                return f'HTTP {response.status_code}'
+
+            return None
+
+        return await asyncio.gather(
+            *(post(*request) for request in requests))
+
+
+def claim_events(limit):
+    """Забирает события, время попытки которых подошло.
+
+    Строки блокируются с SKIP LOCKED только на время короткой транзакции:
+    попытка сразу засчитывается, а следующая откладывается на
+    WEBHOOK_LEASE секунд. Другие обработчики не возьмут эти события, пока
+    идет отправка, а если обработчик упадет, события вернутся в очередь
+    после аренды, если у них остались попытки.
+    """
+    with transaction.atomic():
+        events = list(WebhookEvent.objects.due().filter(
+            subscription__is_active=True,
+            attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS).select_related(
+            'subscription').select_for_update(
+            skip_locked=True, of=('self',)).order_by('id')[:limit])
+        if not events:
+            return []
+
+        lease_until = timezone.now() + timedelta(
+            seconds=settings.WEBHOOK_LEASE)
+        WebhookEvent.objects.filter(pk__in=[
+            event.pk for event in events]).update(
+            attempts=F('attempts') + 1, next_attempt_at=lease_until)
+
+    for event in events:
+        event.attempts += 1
+
+    return events
+
+
+def deliver_pending(limit=1000, batch_size=None, concurrency=None):
+    """Доставляет события, время попытки которых подошло.
+
+    Запросы отправляются вне транзакции, результат записывается отдельной
+    короткой транзакцией. Возвращает число доставленных и недоставленных
+    событий.
+    """
+    batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+    concurrency = concurrency or settings.WEBHOOK_CONCURRENCY
+
+    events = claim_events(limit)
+    if not events:
+        return 0, 0
+
+    batches = build_batches(events, batch_size)
+    errors = asyncio.run(post_requests(
+        [build_request(subscription, batch_events)
+         for subscription, batch_events in batches],
+        concurrency, settings.WEBHOOK_TIMEOUT))
+
+    now = timezone.now()
+    delivered = failed = 0
+
+    for (subscription, batch_events), error in zip(batches, errors):
+        for event in batch_events:
+            event.last_error = error or ''
+
+            if error is None:
+                event.delivered_at = now
+                event.next_attempt_at = None
+                delivered += 1
+                continue
+
+            failed += 1
+            if event.attempts < settings.WEBHOOK_MAX_ATTEMPTS:
+                event.next_attempt_at = now + get_retry_delay(event.attempts)
+            else:
+                event.next_attempt_at = None
+
+    with transaction.atomic():
+        WebhookEvent.objects.bulk_update(
+            events, ['last_error', 'delivered_at', 'next_attempt_at'])
+
+    return delivered, failed
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from webhooks.delivery import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Доставляет накопившиеся события вебхуков подписчикам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, опрашивая очередь')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между опросами пустой очереди, с')
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Сколько событий забирать из очереди за раз')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--concurrency', type=int)
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = deliver_pending(
+                limit=options['limit'], batch_size=options['batch_size'],
+                concurrency=options['concurrency'])
+
+            if delivered or failed:
+                self.stdout.write(
+                    f'Доставлено: {delivered}, ошибок: {failed}')
+
+            if not options['loop']:
+                break
+
+            if delivered + failed < options['limit']:
+                time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from webhooks.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = 'Удаляет доставленные события вебхуков старше срока хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.WEBHOOK_RETENTION_DAYS,
+            help='Срок хранения доставленных событий, дней')
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.WEBHOOK_PRUNE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        delivered_before = timezone.now() - timedelta(days=options['days'])
+        deleted = WebhookEvent.objects.prune(
+            delivered_before, options['batch_size'])
+
+        self.stdout.write(f'Удалено доставленных событий: {deleted}')
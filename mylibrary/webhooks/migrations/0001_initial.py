@@ -0,0 +1,49 @@
+# Generated by Django 3.2.8 on 2026-10-19 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import webhooks.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('url', models.URLField(max_length=500, verbose_name='Адрес')),
+                ('secret', models.CharField(default=webhooks.models.generate_secret, max_length=64, verbose_name='Ключ подписи')),
+                ('event_type', models.CharField(choices=[('book.created', 'Новая книга')], default='book.created', max_length=50, verbose_name='Событие')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('event_type', models.CharField(max_length=50, verbose_name='Событие')),
+                ('payload', models.JSONField(verbose_name='Данные')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, null=True, verbose_name='Следующая попытка')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Доставлено')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='webhooks.webhooksubscription', verbose_name='Подписка')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['next_attempt_at'], name='webhook_event_due'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import secrets
+
+from django.db import models
+from django.utils import timezone
+
+from library.models import CreatedModel
+
+BOOK_CREATED = 'book.created'
+EVENT_TYPES = (
+    (BOOK_CREATED, 'Новая книга'),
+)
+
+
+def generate_secret():
+    return secrets.token_hex(32)
+
+
+class WebhookSubscription(CreatedModel):
+    url = models.URLField('Адрес', max_length=500)
+    secret = models.CharField(
+        'Ключ подписи', max_length=64, default=generate_secret)
+    event_type = models.CharField(
+        'Событие', max_length=50, choices=EVENT_TYPES, default=BOOK_CREATED)
+    is_active = models.BooleanField('Активна', default=True)
+
+    def __str__(self):
+        return self.url
+
+
+class WebhookEventQuerySet(models.QuerySet):
+    def due(self, now=None):
+        return self.filter(
+            delivered_at__isnull=True,
+            next_attempt_at__lte=now or timezone.now())
+
+    def prune(self, delivered_before, batch_size):
+        """Удаляет доставленные раньше delivered_before события пачками.
+
+        Возвращает число удаленных событий.
+        """
+        deleted = 0
+        while True:
+            ids = list(self.filter(delivered_at__lt=delivered_before).order_by(
+                'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+
+            deleted += self.filter(pk__in=ids).delete()[0]
+
+
+class WebhookEvent(CreatedModel):
+    """Событие в очереди на доставку.
+
+    Строка создается в транзакции, которая породила событие, и доставляется
+    командой deliver_webhooks. next_attempt_at пуст у доставленных событий
+    и у событий, для которых исчерпаны попытки.
+    """
+    subscription = models.ForeignKey(
+        WebhookSubscription, related_name='events', on_delete=models.CASCADE,
+        verbose_name='Подписка')
+    event_type = models.CharField('Событие', max_length=50)
+    payload = models.JSONField('Данные')
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка', null=True, default=timezone.now)
+    delivered_at = models.DateTimeField('Доставлено', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    objects = WebhookEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'], name='webhook_event_due',
+                condition=models.Q(delivered_at__isnull=True)),
+        ]
+
+
+def enqueue_event(event_type, payload):
+    subscriptions = WebhookSubscription.objects.filter(
+        event_type=event_type, is_active=True).values_list('id', flat=True)
+
+    return WebhookEvent.objects.bulk_create(
+        WebhookEvent(subscription_id=subscription_id, event_type=event_type,
+                     payload=payload)
+        for subscription_id in subscriptions)
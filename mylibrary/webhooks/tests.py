@@ -0,0 +1,141 @@
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webhooks.delivery import (SIGNATURE_HEADER, TIMESTAMP_HEADER,
+                               deliver_pending, sign)
+from webhooks.models import (BOOK_CREATED, WebhookEvent, WebhookSubscription,
+                             enqueue_event)
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.path, dict(self.headers), body))
+
+        status = self.server.statuses.get(self.path, 200)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(WEBHOOK_BATCH_SIZE=2, WEBHOOK_MAX_ATTEMPTS=2)
+class DeliveryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        cls.server.received = []
+        cls.server.statuses = {'/broken': 503}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.received.clear()
+
+    def test_events_are_batched_and_signed(self):
+        subscription = WebhookSubscription.objects.create(
+            url=f'{self.base_url}/hook')
+        WebhookSubscription.objects.create(
+            url=f'{self.base_url}/disabled', is_active=False)
+        for number in range(3):
+            enqueue_event(BOOK_CREATED, {'id': number})
+
+        self.assertEqual(deliver_pending(), (3, 0))
+
+        self.assertEqual(
+            [path for path, headers, body in self.server.received],
+            ['/hook', '/hook'])
+        path, headers, body = self.server.received[0]
+        self.assertEqual(
+            headers[SIGNATURE_HEADER],
+            'sha256=' + sign(subscription.secret, headers[TIMESTAMP_HEADER],
+                             body))
+        self.assertEqual(
+            [event['data'] for event in json.loads(body)['events']],
+            [{'id': 0}, {'id': 1}])
+        self.assertFalse(WebhookEvent.objects.due().exists())
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        WebhookSubscription.objects.create(url=f'{self.base_url}/broken')
+        event, = enqueue_event(BOOK_CREATED, {'id': 1})
+
+        self.assertEqual(deliver_pending(), (0, 1))
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, 'HTTP 503')
+        self.assertGreater(event.next_attempt_at, timezone.now())
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (0, 1))
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNone(event.next_attempt_at)
+        self.assertIsNone(event.delivered_at)
+
+    def test_claimed_events_wait_for_lease(self):
+        WebhookSubscription.objects.create(url=f'{self.base_url}/hook')
+        event, = enqueue_event(BOOK_CREATED, {'id': 1})
+
+        with mock.patch('webhooks.delivery.post_requests',
+                        side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                deliver_pending()
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (1, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+
+    def test_lease_does_not_exceed_max_attempts(self):
+        WebhookSubscription.objects.create(url=f'{self.base_url}/hook')
+        event, = enqueue_event(BOOK_CREATED, {'id': 1})
+        # Обработчик упал во время последней попытки
+        WebhookEvent.objects.update(attempts=2)
+
+        self.assertEqual(deliver_pending(), (0, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+
+    def test_delivered_events_are_pruned(self):
+        WebhookSubscription.objects.create(url=f'{self.base_url}/hook')
+        old, new, pending = [enqueue_event(BOOK_CREATED, {'id': number})[0]
+                             for number in range(3)]
+        now = timezone.now()
+        WebhookEvent.objects.filter(pk=old.pk).update(
+            delivered_at=now - timedelta(days=8))
+        WebhookEvent.objects.filter(pk=new.pk).update(delivered_at=now)
+
+        call_command('prune_webhook_events', days=7, batch_size=1,
+                     stdout=StringIO())
+
+        self.assertEqual(
+            list(WebhookEvent.objects.order_by('id').values_list(
+                'id', flat=True)), [new.pk, pending.pk])